@@ -1,9 +1,25 @@
-from flask import Flask, jsonify, request
-from llm import request_code, generate_tests
+from logs import configure_logging
+# Before the imports below, which start worker pools that may log
+configure_logging()
+
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from llm import request_code, stream_code, generate_tests, llm_cache
+from llm_client import LLMError, LLMUnavailable
 from flask_cors import CORS
-from compile import compile_and_run
+from compile import ALLOWED_LANGUAGES, OPT_LEVELS, run_dirs, jvm_pool, python_pool, bash_pool
+from executors import create_executor
+from scheduler import JobScheduler, QueueFull, parse_limits
+from batch import validate_cases
+from workflow import run_workflow
+from metrics import registry, collect_timings, stop_timings
 from functools import wraps
+import json as jsonlib
+import logging
+import math
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
@@ -18,6 +34,61 @@ CORS(app, resources={
     }
 })
 
+# Runs submissions here or on runner daemons (EXECUTOR)
+executor = create_executor()
+
+# Background execution for `"async": true` compile requests
+scheduler = JobScheduler(
+    executor.compile_and_run,
+    workers=int(os.environ.get('JOB_WORKERS', os.cpu_count() or 2)),
+    queue_size=int(os.environ.get('JOB_QUEUE_SIZE', 100)),
+    language_limits=parse_limits(os.environ.get('JOB_LANGUAGE_LIMITS', 'java=2')),
+    result_ttl=float(os.environ.get('JOB_RESULT_TTL', 300)),
+    spool_dir=os.environ.get('JOB_SPOOL_DIR') or None
+)
+MAX_POLL_WAIT = 30  # seconds
+
+# State other components already keep, read when /metrics is scraped
+registry.collect('job_queue_depth', 'gauge', 'Async jobs waiting for a worker.',
+                 lambda: scheduler.stats()['queue_depth'])
+registry.collect('run_dirs_in_use', 'gauge', 'Run directories currently in use.',
+                 lambda: run_dirs.stats()['in_use'])
+registry.collect('llm_cache_requests_total', 'counter', 'LLM cache lookups, by result.',
+                 lambda: {(('result', result),): llm_cache.stats()[result] for result in ('hits', 'misses', 'coalesced')})
+registry.collect('llm_cache_saved_tokens_total', 'counter', 'Tokens not spent thanks to the LLM cache.',
+                 lambda: llm_cache.stats()['saved_tokens'])
+
+@app.before_request
+def start_request():
+    g.start = time.perf_counter()
+    # `"timings": true` in the body (or ?timings=1) adds per-phase durations to the response
+    body = request.get_json(silent=True) if request.is_json else None
+    if request.args.get('timings') == '1' or (isinstance(body, dict) and body.get('timings') is True):
+        g.timings_token = collect_timings()
+
+@app.after_request
+def finish_request(response):
+    token = g.pop('timings_token', None)
+    if token is not None:
+        timings = stop_timings(token)
+        body = response.get_json(silent=True) if not response.is_streamed else None
+        if isinstance(body, dict):
+            body['timings'] = timings
+            response.set_data(jsonlib.dumps(body))
+
+    # Streamed responses count until their headers are sent
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    registry.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+    registry.observe('http_request_seconds', time.perf_counter() - g.start, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def end_request(_):
+    # after_request is skipped when a handler raises
+    token = g.pop('timings_token', None)
+    if token is not None:
+        stop_timings(token)
+
 def require_json(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -26,6 +97,30 @@ def require_json(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def event_stream(events):
+    """Send (event, data) pairs to the client as Server-Sent Events."""
+    def generate():
+        for event, data in events:
+            yield f"event: {event}\ndata: {jsonlib.dumps(data)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def opt_level_error(opt_level):
+    """Message for an unknown `opt_level` request field, None if it is fine."""
+    if opt_level is not None and opt_level not in OPT_LEVELS:
+        return f"'opt_level' must be one of {', '.join(OPT_LEVELS)}."
+    return None
+
+def llm_error(error):
+    """Fast failure response for an LLM call that could not complete."""
+    if isinstance(error, LLMUnavailable):
+        return jsonify({"error": str(error)}), 503, {'Retry-After': '2'}
+    return jsonify({"error": str(error)}), 502
+
 @app.route('/api/imgtocode', methods=['POST'])
 @require_json
 def imgtocode():
@@ -43,7 +138,10 @@ def imgtocode():
             code, language, concept, summary, analysis = request_code(img_base64=img_base64)
         else:
             return jsonify({'error': 'Invalid input'}), 400
+    except LLMError as e:
+        return llm_error(e)
     except:
+        logger.exception("Transcription failed")
         response = {
             'code': '',
             'language': 'python',
@@ -60,29 +158,59 @@ def imgtocode():
         'summary': summary,
         'analysis': analysis,
     }
-    print(response)
+    logger.info("Transcribed image", extra={'language': language, 'code_length': len(code or '')})
     return jsonify(response), 201
 
+@app.route('/api/imgtocode/stream', methods=['POST'])
+@require_json
+def imgtocode_stream():
+    img_url = request.json.get('img_url')
+    img_base64 = request.json.get('img_base64')
+    if not img_url and not img_base64:
+        return jsonify({'error': 'Missing img_url or img_base64'}), 400
+
+    def events():
+        try:
+            yield from stream_code(img_url=img_url, img_base64=img_base64)
+        except LLMError as e:
+            yield 'error', {'error': str(e)}
+
+    return event_stream(events())
+
+@app.route('/api/workflow', methods=['POST'])
+@require_json
+def workflow():
+    img_url = request.json.get('img_url')
+    img_base64 = request.json.get('img_base64')
+    if not img_url and not img_base64:
+        return jsonify({'error': 'Missing img_url or img_base64'}), 400
+    opt_level = request.json.get('opt_level')
+    error = opt_level_error(opt_level)
+    if error:
+        return jsonify({"error": error}), 400
+
+    return event_stream(run_workflow(executor, img_url=img_url, img_base64=img_base64, opt_level=opt_level))
+
 @app.route('/api/generatetests', methods=['POST'])
 @require_json
 def tests():
-    print("test")
     code = request.json.get('code')
     language = request.json.get('language')
-    print(code)
-    print(language)
     
     if not code or not language:
         return jsonify({"error": "Both 'code' and 'language' are required fields."}), 400
 
-    code_out, language, reason, status = generate_tests(code, language)
+    try:
+        code_out, language, reason, status = generate_tests(code, language)
+    except LLMError as e:
+        return llm_error(e)
     response = {
         'code': code_out,
         'language': language,
         'reason': reason,
         'status': status
     }
-    print(response)
+    logger.info("Generated tests", extra={'language': language, 'status': status})
     return jsonify(response), 201
 
 
@@ -94,11 +222,100 @@ def compile():
     
     if not code or not language:
         return jsonify({"error": "Both 'code' and 'language' are required fields."}), 400
+    opt_level = request.json.get('opt_level')
+    error = opt_level_error(opt_level)
+    if error:
+        return jsonify({"error": error}), 400
 
-    output = compile_and_run(code, language)
+    if request.json.get('async'):
+        if language not in ALLOWED_LANGUAGES:
+            return jsonify({"error": f"Language '{language}' not supported."}), 400
+        try:
+            job = scheduler.submit(language, code, language, opt_level)
+        except QueueFull as e:
+            return jsonify({"error": str(e)}), 429, {'Retry-After': '1'}
+        return jsonify(job.to_dict()), 202, {'Location': f'/api/jobs/{job.id}'}
+
+    output = executor.compile_and_run(code, language, opt_level)
     return jsonify(output[0]), output[1]
 
 
+@app.route('/api/compile/stream', methods=['POST'])
+@require_json
+def compile_stream():
+    code = request.json.get('code')
+    language = request.json.get('language')
+
+    if not code or not language:
+        return jsonify({"error": "Both 'code' and 'language' are required fields."}), 400
+    opt_level = request.json.get('opt_level')
+    error = opt_level_error(opt_level)
+    if error:
+        return jsonify({"error": error}), 400
+
+    return event_stream(executor.stream_compile_and_run(code, language, opt_level))
+
+
+@app.route('/api/compile/batch', methods=['POST'])
+@require_json
+def compile_batch():
+    code = request.json.get('code')
+    language = request.json.get('language')
+    cases = request.json.get('cases')
+
+    if not code or not language:
+        return jsonify({"error": "Both 'code' and 'language' are required fields."}), 400
+    opt_level = request.json.get('opt_level')
+    error = validate_cases(cases) or opt_level_error(opt_level)
+    if error:
+        return jsonify({"error": error}), 400
+
+    output = executor.run_batch(code, language, cases, opt_level)
+    return jsonify(output[0]), output[1]
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = math.nan
+    # nan would slip through min() and never reach the poll deadline
+    if not (math.isfinite(wait) and wait >= 0):
+        return jsonify({"error": "'wait' must be a non-negative number of seconds."}), 400
+    wait = min(wait, MAX_POLL_WAIT)
+
+    job = scheduler.status(job_id, wait=wait)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(scheduler.stats()), 200
+
+
+@app.route('/api/rundirs/stats', methods=['GET'])
+def run_dir_stats():
+    return jsonify(run_dirs.stats()), 200
+
+
+@app.route('/api/executor/stats', methods=['GET'])
+def executor_stats():
+    return jsonify(executor.stats()), 200
+
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify({'cache': llm_cache.stats()}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(_):
@@ -109,6 +326,17 @@ def method_not_allowed(_):
     return jsonify({"error": "Method not allowed"}), 405
 
 
+def shutdown(timeout: float):
+    """Drain async jobs (up to `timeout` seconds), then stop helper processes."""
+    if not scheduler.shutdown(timeout):
+        logger.warning("Exiting with async jobs unfinished", extra={'timeout': timeout})
+    executor.close()
+    jvm_pool.close()
+    python_pool.stop()
+    bash_pool.close()
+    registry.flush()
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
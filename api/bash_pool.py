@@ -0,0 +1,280 @@
+import os
+import queue
+import re
+import selectors
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+from sandbox import read_output_files, release
+
+# Jobs a worker runs before it is replaced
+MAX_JOBS = 200
+# A worker's own CPU rlimit; jobs get theirs from `ulimit` (see DRIVER)
+WORKER_CPU_SECONDS = 3600
+SOURCE_NAME = 'source.sh'
+
+# Clean environment for workers: nothing from the server (API keys included)
+BASH_ENV = {
+    'PATH': '/usr/local/bin:/usr/bin:/bin',
+    'LANG': 'C.UTF-8',
+    'SHELL': '/bin/bash',
+}
+
+# Runs in each worker. Reads "<run_dir>\t<cpu seconds>" jobs from stdin. Each
+# job is a forked subshell that leads its own process group (set -m) and runs
+# the script in a child subshell that sets up the run (cwd, limits,
+# environment) and execs `bash source.sh`, so the script sees exactly what a
+# bash started per request would ($0, `return` at top level, a fresh shell
+# state) and nothing it does reaches the worker. Once
+# the script is done the leader reports its status and kills its own group:
+# background processes go while the group id still cannot be reused. Answers
+# with tagged lines ("pid", "status" and "done" in any order until "done")
+# followed by the output of `times` (cumulative CPU time of finished jobs).
+DRIVER = r'''
+exec 2>/dev/null
+set -m
+while IFS=$'\t' read -r __dir __cpu; do
+    (
+        set +m
+        (
+            exec </dev/null >"$__dir/.stdout" 2>"$__dir/.stderr"
+            cd -- "$__dir" || exit 126
+            ulimit -S -t "$__cpu"
+            ulimit -H -t $((__cpu + 1))
+            # SHLVL as in a bash started by the server
+            export HOME="$__dir" TMPDIR="$__dir" SHLVL=0
+            unset __dir __cpu OLDPWD
+            exec bash source.sh
+        )
+        echo "status $?"
+        kill -KILL 0
+    ) &
+    echo "pid $!"
+    wait "$!"
+    echo "done $?"
+    times
+done
+'''
+
+_TIMES = re.compile(r'(\d+)m([\d.]+)s')
+
+
+class BashPoolUnavailable(Exception):
+    """No idle worker; the caller should start bash itself."""
+
+
+class BashWorker:
+    """One long-lived bash running DRIVER inside the sandbox."""
+
+    def __init__(self, sandbox, home: str):
+        self.process = sandbox.spawn(
+            ['bash', '--noprofile', '--norc', '-c', DRIVER, 'bash-worker'],
+            home,
+            WORKER_CPU_SECONDS,
+            env=dict(BASH_ENV, HOME=home),
+            stdin=subprocess.PIPE
+        )
+        self.process.stderr.close()
+        self.jobs = 0
+        self.children_cpu = 0.0
+        # False once the worker's answers can no longer be trusted to line up
+        self.reusable = True
+        self._buffer = b''
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.process.stdout, selectors.EVENT_READ)
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, run_dir: str, timeout: float) -> tuple:
+        """
+        Run run_dir/source.sh. Returns (returncode, cpu_time, terminated_by),
+        cpu_time None when the worker did not report it. Raises
+        BashPoolUnavailable when the worker could not take the job,
+        subprocess.TimeoutExpired (the job is killed), and OSError or
+        ValueError when the worker stopped answering mid-job.
+        """
+        self.jobs += 1
+        cpu = int(timeout) + 1
+        deadline = time.monotonic() + timeout
+        try:
+            self.process.stdin.write(f'{run_dir}\t{cpu}\n'.encode('utf-8'))
+            self.process.stdin.flush()
+        except OSError:
+            raise BashPoolUnavailable("Bash worker exited before taking the job")
+        fields = {}
+        try:
+            while 'done' not in fields:
+                tag, _, value = self._read_line(deadline).partition(' ')
+                fields[tag] = int(value)
+        except subprocess.TimeoutExpired:
+            # Still running, so its leader is not reaped and the group id is its own
+            if 'pid' in fields:
+                _kill_group(fields['pid'])
+            raise subprocess.TimeoutExpired(['bash', SOURCE_NAME], timeout)
+        # Without "status" the leader itself was killed (e.g. out of memory)
+        status = fields.get('status', fields['done'])
+        # The job is over whatever happens here: a worker that fails to
+        # report its times only costs the CPU figure (and its place in the pool)
+        try:
+            self._read_line(time.monotonic() + 1)  # the worker's own times
+            children = sum(
+                int(minutes) * 60 + float(seconds)
+                for minutes, seconds in _TIMES.findall(self._read_line(time.monotonic() + 1))
+            )
+            cpu_time, self.children_cpu = children - self.children_cpu, children
+        except (subprocess.TimeoutExpired, OSError):
+            cpu_time = None
+            self.reusable = False
+
+        terminated_by = 'exit'
+        if status == 128 + signal.SIGXCPU or (
+            status == 128 + signal.SIGKILL and cpu_time is not None and cpu_time >= cpu
+        ):
+            terminated_by = 'cpu_limit'
+        elif status == 128 + signal.SIGXFSZ:
+            terminated_by = 'file_size_limit'
+        elif status > 128:
+            terminated_by = 'signal'
+        return status, cpu_time, terminated_by
+
+    def kill(self):
+        release(self.process)
+        self._selector.close()
+
+    def _read_line(self, deadline: float) -> str:
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._selector.select(remaining):
+                raise subprocess.TimeoutExpired(['bash-worker'], 0)
+            data = os.read(self.process.stdout.fileno(), 4096)
+            if not data:
+                raise OSError("bash worker exited")
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line.decode('utf-8')
+
+
+class BashPool:
+    """
+    Pre-started bash workers for Bash submissions.
+
+    Each worker is a bash process started once inside the sandbox (rlimits,
+    own session, cgroup when configured) with a clean environment. A job is
+    forked by the already running shell, so a short script does not pay for
+    spawning a process from the server (the sandbox wrapper, Popen and its
+    pipes), and runs in its run directory with HOME and TMPDIR pointing
+    there. Workers are
+    replaced after `max_jobs` jobs and after a timeout.
+
+    There is no jail: jobs run as the server's user and see the same
+    filesystem (no chroot, namespaces or dedicated UID), exactly like Bash
+    runs started per request. What confines them is the sandbox envelope,
+    the run directory as cwd and the clean environment.
+    """
+
+    def __init__(self, size: int, sandbox, max_output: int, max_jobs: int = MAX_JOBS):
+        self.size = size
+        self.sandbox = sandbox
+        self.max_output = max_output
+        self.max_jobs = max_jobs
+        self._idle = queue.Queue()
+        self._home = tempfile.mkdtemp(prefix='bash_pool_')
+        self._closed = False
+        if size > 0:
+            threading.Thread(target=self._fill, daemon=True).start()
+
+    def run(self, source: str, run_dir: str, timeout: float) -> tuple:
+        """
+        Run a Bash submission in `run_dir`.
+        Returns (returncode, stdout, stderr, resources) with resources shaped
+        like sandbox.Sandbox.run's; a worker lost mid-job is a failed run.
+        Raises subprocess.TimeoutExpired, and BashPoolUnavailable when no job
+        was handed to a worker (none idle, or it had exited).
+        """
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            raise BashPoolUnavailable("No idle bash worker")
+        if not worker.alive():
+            self._replace(worker)
+            raise BashPoolUnavailable("Bash worker exited while idle")
+
+        with open(os.path.join(run_dir, SOURCE_NAME), 'w') as f:
+            f.write(source)
+        start = time.monotonic()
+        lost = False
+        try:
+            returncode, cpu_time, terminated_by = worker.run(run_dir, timeout)
+        except (subprocess.TimeoutExpired, BashPoolUnavailable):
+            self._replace(worker)
+            raise
+        except (OSError, ValueError):
+            # The script may have done part of its work: running it again
+            # elsewhere could repeat that, so this is a failed run
+            self._replace(worker)
+            returncode, cpu_time, terminated_by = 1, None, 'signal'
+            lost = True
+        else:
+            if self._closed or not worker.reusable or worker.jobs >= self.max_jobs:
+                self._replace(worker)
+            else:
+                self._idle.put(worker)
+
+        resources = {
+            "cpu_time": None if cpu_time is None else round(cpu_time, 4),
+            "wall_time": round(time.monotonic() - start, 4),
+            "peak_memory_kb": None,
+            "terminated_by": terminated_by,
+        }
+        stdout, stderr, over_limit = read_output_files(run_dir, self.max_output)
+        if lost:
+            if not stderr:
+                stderr = "Bash worker died during the run; output may be incomplete"
+        elif over_limit:
+            resources["terminated_by"] = "output_limit"
+            if not stderr:
+                stderr = f"Output limit of {self.max_output} characters reached; output truncated"
+        elif not stderr and terminated_by == 'cpu_limit':
+            stderr = f"CPU time limit of {int(timeout) + 1} seconds exceeded"
+        elif not stderr and terminated_by == 'file_size_limit':
+            stderr = "File size limit exceeded; process killed"
+        return returncode, stdout, stderr, resources
+
+    def close(self):
+        """Kill the idle workers; busy ones are retired when their job ends."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+    def _spawn(self) -> BashWorker:
+        return BashWorker(self.sandbox, self._home)
+
+    def _fill(self):
+        for _ in range(self.size):
+            try:
+                self._idle.put(self._spawn())
+            except OSError:
+                return
+
+    def _replace(self, worker: BashWorker):
+        worker.kill()
+        if self._closed:
+            return
+        try:
+            self._idle.put(self._spawn())
+        except OSError:
+            pass
+
+
+def _kill_group(pgid: int):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except OSError:
+        pass
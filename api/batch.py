@@ -0,0 +1,105 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from compile import (
+    ALLOWED_LANGUAGES, HAVE_MEMFD, compile_cached, get_run_command, memory_file, open_source, run_dirs, spawn_run
+)
+from sandbox import pump_output, release
+
+MAX_BATCH_CASES = 50
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 2))
+
+
+def validate_cases(cases) -> str:
+    """Return an error message if `cases` is not a usable list of test cases."""
+    if not isinstance(cases, list) or not cases:
+        return "'cases' must be a non-empty list."
+    if len(cases) > MAX_BATCH_CASES:
+        return f"At most {MAX_BATCH_CASES} cases are allowed per batch."
+    for case in cases:
+        if not isinstance(case, dict):
+            return "Each case must be an object with optional 'stdin' and 'args'."
+        if not isinstance(case.get('stdin', ''), str):
+            return "'stdin' must be a string."
+        args = case.get('args', [])
+        if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+            return "'args' must be a list of strings."
+    return ""
+
+
+def run_batch(code, language, cases, opt_level=None):
+    """
+    Compile `code` once, then run every case in parallel.
+    Each case may provide 'stdin' (str) and 'args' (list of str); results come
+    back in the same order with output, exit code and resource usage.
+    """
+    lang_config = ALLOWED_LANGUAGES.get(language)
+    if not lang_config:
+        return {"error": f"Language '{language}' not supported."}, 400
+
+    response = {}
+    with run_dirs.acquire() as run_dir, ExitStack() as cleanup:
+        try:
+            file_path = cleanup.enter_context(open_source(code, language, run_dir))
+        except Exception as e:
+            return {"success": False, "error": str(e), "cases": []}, 200
+
+        if lang_config.get('compile_command'):
+            success, compile_error, response['compile_cache'] = compile_cached(
+                code, file_path, language, run_dir, opt_level
+            )
+            if not success:
+                response.update({
+                    "success": False,
+                    "error": f"Compilation error: {compile_error}",
+                    "cases": []
+                })
+                return response, 200
+
+        command = get_run_command(language, file_path, run_dir)
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(cases))) as executor:
+            results = list(executor.map(
+                lambda item: _run_case(language, command, run_dir, item[0], item[1], lang_config['timeout']),
+                enumerate(cases)
+            ))
+
+    response.update({
+        "success": all(result['success'] for result in results),
+        "error": "",
+        "cases": results
+    })
+    return response, 200
+
+
+def _run_case(language, command, run_dir, index, case, timeout):
+    """Run one case to completion and collect its output."""
+    stdout, stderr = [], []
+    with ExitStack() as cleanup:
+        if HAVE_MEMFD:
+            stdin = cleanup.enter_context(memory_file(f'stdin-{index}', case.get('stdin', '')))
+        else:
+            stdin_path = os.path.join(run_dir, f'.stdin-{index}')
+            with open(stdin_path, 'w') as f:
+                f.write(case.get('stdin', ''))
+            stdin = cleanup.enter_context(open(stdin_path))
+
+        start = time.monotonic()
+        process = spawn_run(language, command + case.get('args', []), run_dir, stdin=stdin)
+        try:
+            for event, data in pump_output(process, timeout, start):
+                if event == 'stdout':
+                    stdout.append(data)
+                elif event == 'stderr':
+                    stderr.append(data)
+                else:
+                    result = data
+        finally:
+            release(process)
+
+    result.update({
+        "stdout": ''.join(stdout),
+        "stderr": ''.join(stderr),
+    })
+    return result
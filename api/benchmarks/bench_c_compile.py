@@ -0,0 +1,109 @@
+"""
+Compile latency of C submissions: plain `gcc source.c` against the toolchain
+profile (optimization level, fast linker, precompiled headers).
+
+    python benchmarks/bench_c_compile.py [--repeat 20] [--levels O0 O2]
+
+Each corpus C program is compiled in a scratch directory, bypassing the
+compile cache. A typical networking/threads assignment that includes most of
+the precompiled header set is measured alongside the corpus.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ctoolchain import CToolchain, OPT_LEVELS  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+HEADERS = (
+    'stdio.h,stdlib.h,string.h,math.h,ctype.h,stdbool.h,stdint.h,limits.h,time.h,errno.h,assert.h,'
+    'unistd.h,fcntl.h,signal.h,pthread.h,sys/types.h,sys/wait.h,sys/socket.h,netinet/in.h,arpa/inet.h'
+).split(',')
+
+ASSIGNMENT = """#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <pthread.h>
+#include <sys/socket.h>
+#include <netinet/in.h>
+#include <arpa/inet.h>
+
+static void *worker(void *arg) {
+    int *value = arg;
+    *value *= 2;
+    return NULL;
+}
+
+int main(void) {
+    struct sockaddr_in address;
+    memset(&address, 0, sizeof(address));
+    address.sin_family = AF_INET;
+    address.sin_port = htons(8080);
+    inet_pton(AF_INET, "127.0.0.1", &address.sin_addr);
+
+    int value = 21;
+    pthread_t thread;
+    pthread_create(&thread, NULL, worker, &value);
+    pthread_join(thread, NULL);
+    printf("%d %u\\n", value, ntohs(address.sin_port));
+    return 0;
+}
+"""
+
+
+def programs():
+    found = [('assignment', ASSIGNMENT)]
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith('.c') and name != 'compile_error.c':
+            with open(os.path.join(CORPUS_DIR, name)) as f:
+                found.append((name[:-2], f.read()))
+    return found
+
+
+def median_ms(command, source, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'source.c')
+        with open(path, 'w') as f:
+            f.write(source)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process = subprocess.run(command + [path], cwd=directory, capture_output=True, text=True)
+            times.append(time.perf_counter() - start)
+            if process.returncode != 0:
+                raise SystemExit(f"{' '.join(command)} failed:\n{process.stderr}")
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--levels', nargs='+', default=['O0', 'O2'], choices=OPT_LEVELS)
+    parser.add_argument('--linker', default='auto', help='auto, lld, gold or default')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        toolchain = CToolchain(directory, HEADERS, args.linker)
+        for level in args.levels:
+            toolchain.prepare(level, wait=True)
+        print(f"linker: {toolchain.linker or 'default'}; median ms over {args.repeat} compiles")
+        print(f"{'program':<14} {'level':<6} {'plain':>8} {'+linker':>8} {'+pch':>8}")
+        for name, source in programs():
+            for level in args.levels:
+                plain = median_ms(['gcc', f'-{level}'], source, args.repeat)
+                linked = median_ms(['gcc'] + toolchain.flags(level), source, args.repeat)
+                pch = toolchain.precompiled_header(source, level)
+                full = median_ms(['gcc'] + toolchain.flags(level) + ['-include', pch], source, args.repeat) if pch else linked
+                print(f"{name:<14} {level:<6} {plain:>8.1f} {linked:>8.1f} {full:>8.1f}")
+        print(f"baseline (gcc source.c, as before): "
+              f"{median_ms(['gcc'], ASSIGNMENT, args.repeat):.1f} ms for the assignment program")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Throughput of man page formatting on multi-MB `man` output.
+
+    python benchmarks/bench_manpage.py [--sizes 1 4 16] [--chunk 65536]
+
+Compares the previous character-by-character implementation with
+format_manual_page and the streaming ManPageFormatter.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from manpage import ManPageFormatter, format_manual_page  # noqa: E402
+
+
+def previous_format_manual_page(raw_text):
+    """The implementation format_manual_page replaced, kept for comparison."""
+    cleaned_text = ""
+    i = 0
+    while i < len(raw_text):
+        if i + 1 < len(raw_text) and raw_text[i+1:i+2] == '\b':
+            i += 2
+        else:
+            cleaned_text += raw_text[i]
+            i += 1
+
+    formatted_lines = []
+    for line in cleaned_text.split('\n'):
+        if not line.strip():
+            formatted_lines.append('')
+            continue
+        if any(section in line.upper() for section in ['NAME', 'SYNOPSIS', 'DESCRIPTION', 'EXIT STATUS', 'SEE ALSO', 'STANDARDS']):
+            formatted_lines.append('\n' + line.strip())
+        elif line.startswith(' '):
+            indent = len(line) - len(line.lstrip())
+            formatted_lines.append(' ' * indent + line.strip())
+        else:
+            formatted_lines.append(line.strip())
+    return '\n'.join(formatted_lines)
+
+
+def bold(text):
+    return ''.join(f'{c}\b{c}' for c in text)
+
+
+def underline(text):
+    return ''.join(f'_\b{c}' for c in text)
+
+
+def man_page(size):
+    """Synthetic `man` output with bold headers and underlined arguments."""
+    block = (
+        f"{bold('NAME')}\n     ls - list directory contents\n\n"
+        f"{bold('SYNOPSIS')}\n     {bold('ls')} [{bold('-ABCFGHLOPRSTUW@abcdefghiklmnopqrstuwx1%')}] [{underline('file')} {underline('...')}]\n\n"
+        f"{bold('DESCRIPTION')}\n     For each operand that names a {underline('file')} of a type other than directory,\n"
+        "     ls displays its name as well as any requested, associated information.\n"
+        f"     {bold('-a')}      Include directory entries whose names begin with a dot ({underline('.')}).\n\n"
+    )
+    return (block * (size // len(block) + 1))[:size]
+
+
+def measure(func, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def streamed(chunk_size, max_length=None):
+    def run(text):
+        formatter = ManPageFormatter(max_length)
+        for i in range(0, len(text), chunk_size):
+            formatter.feed(text[i:i + chunk_size])
+            if formatter.done:
+                break
+        formatter.finish()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='input sizes in MB')
+    parser.add_argument('--chunk', type=int, default=64 * 1024, help='chunk size for the streaming variant')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    variants = [
+        ('previous', previous_format_manual_page),
+        ('format_manual_page', format_manual_page),
+        ('streaming', streamed(args.chunk)),
+        ('streaming, 10k cap', streamed(args.chunk, max_length=10000)),
+    ]
+    print(f"{'size':>8}  {'variant':<20} {'seconds':>9} {'MB/s':>9}")
+    for size_mb in args.sizes:
+        text = man_page(int(size_mb * 1024 * 1024))
+        assert format_manual_page(text) == previous_format_manual_page(text)
+        for name, func in variants:
+            seconds = measure(func, text, args.repeat)
+            print(f"{size_mb:>6g}MB  {name:<20} {seconds:>9.4f} {size_mb / seconds:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
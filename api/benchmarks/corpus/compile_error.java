@@ -0,0 +1,9 @@
+public class Main {
+    public static void main(String[] args) {
+        int total = 0
+        for (int i = 0; i < 10; i++) {
+            total += i;
+        }
+        System.out.println(totl);
+    }
+}
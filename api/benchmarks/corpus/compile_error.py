@@ -0,0 +1,4 @@
+def total(values)
+    return sum(values)
+
+print(total([1, 2, 3]))
@@ -0,0 +1,19 @@
+public class Main {
+    // Count primes below 2,000,000 by trial division
+    public static void main(String[] args) {
+        int count = 0;
+        for (int n = 2; n < 2000000; n++) {
+            boolean prime = true;
+            for (int d = 2; d * d <= n; d++) {
+                if (n % d == 0) {
+                    prime = false;
+                    break;
+                }
+            }
+            if (prime) {
+                count++;
+            }
+        }
+        System.out.println(count);
+    }
+}
@@ -0,0 +1,11 @@
+# Count primes below 100,000 by trial division
+count = 0
+for n in range(2, 100000):
+    d = 2
+    while d * d <= n:
+        if n % d == 0:
+            break
+        d += 1
+    else:
+        count += 1
+print(count)
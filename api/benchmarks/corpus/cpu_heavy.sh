@@ -0,0 +1,13 @@
+# Count primes below 5,000 by trial division
+count=0
+for ((n = 2; n < 5000; n++)); do
+    prime=1
+    for ((d = 2; d * d <= n; d++)); do
+        if ((n % d == 0)); then
+            prime=0
+            break
+        fi
+    done
+    count=$((count + prime))
+done
+echo "$count"
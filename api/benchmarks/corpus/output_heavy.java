@@ -0,0 +1,7 @@
+public class Main {
+    public static void main(String[] args) {
+        for (int i = 0; i < 100000; i++) {
+            System.out.println("line " + i + ": the quick brown fox jumps over the lazy dog");
+        }
+    }
+}
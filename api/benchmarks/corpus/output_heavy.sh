@@ -0,0 +1,3 @@
+for ((i = 0; i < 100000; i++)); do
+    echo "line $i: the quick brown fox jumps over the lazy dog"
+done
@@ -0,0 +1 @@
+echo "Hello, world!"
@@ -0,0 +1,310 @@
+"""
+Load test for /api/compile, /api/generatetests and /api/imgtocode.
+
+    # start a server with the fake LLM backend and drive it
+    python benchmarks/loadtest.py load --spawn --concurrency 8 --requests 200
+
+    # the same, with submissions running on three runner daemons
+    python benchmarks/loadtest.py load --spawn --runners 3 --endpoints compile
+
+    # or drive a running server
+    python benchmarks/loadtest.py load --url http://localhost:8080 --endpoints compile
+
+    # in-process breakdown of compile_and_run into its phases (see metrics.span)
+    python benchmarks/loadtest.py phases --repeat 10
+
+Programs come from benchmarks/corpus/<case>.<ext>. The cases are trivial,
+cpu_heavy, output_heavy, timeout and compile_error; pick some with
+--cases/--languages. Payloads are identical from request to request unless
+--unique is given, so by default the compile and LLM caches are part of what
+is measured. Results can be saved with --json and compared between runs.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+sys.path.insert(0, API_DIR)
+
+EXTENSIONS = {'c': '.c', 'java': '.java', 'python': '.py', 'bash': '.sh'}
+COMMENTS = {'c': '/* {} */\n', 'java': '// {}\n', 'python': '# {}\n', 'bash': '# {}\n'}
+CASES = ['trivial', 'cpu_heavy', 'output_heavy', 'timeout', 'compile_error']
+ENDPOINTS = ['compile', 'generatetests', 'imgtocode']
+# Spans recorded by compile_and_run (see metrics.span)
+PHASES = ['setup', 'write', 'compile_cache', 'compile', 'spawn', 'execute', 'install', 'format', 'cleanup']
+
+
+def load_corpus(languages, cases):
+    """[(language, case, source)] for every corpus program that exists."""
+    corpus = []
+    for language in languages:
+        for case in cases:
+            path = os.path.join(CORPUS_DIR, case + EXTENSIONS[language])
+            if os.path.exists(path):
+                with open(path) as f:
+                    corpus.append((language, case, f.read()))
+    return corpus
+
+
+def make_image(seed: int) -> str:
+    """A page-sized PNG of random 'text' blocks; different seeds hash differently."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new('L', (1200, 1600), 235)
+    draw = ImageDraw.Draw(image)
+    for row in range(40):
+        x = 80
+        while x < 1100:
+            width = rng.randint(20, 120)
+            draw.rectangle([x, 80 + row * 36, x + width, 100 + row * 36], fill=rng.randint(10, 80))
+            x += width + rng.randint(10, 30)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def build_requests(args):
+    """The whole request plan as [(label, path, payload)], before any timing starts."""
+    corpus = load_corpus(args.languages, args.cases)
+    plan = []
+    images = {}
+    for index in range(args.warmup + args.requests):
+        endpoint = args.endpoints[index % len(args.endpoints)]
+        language, case, source = corpus[(index // len(args.endpoints)) % len(corpus)]
+        if args.unique:
+            source = COMMENTS[language].format(f'request {index}') + source
+        if endpoint == 'compile':
+            plan.append((f'compile {language}/{case}', '/api/compile', {'code': source, 'language': language}))
+        elif endpoint == 'generatetests':
+            plan.append(('generatetests', '/api/generatetests', {'code': source, 'language': language}))
+        else:
+            seed = index if args.unique else 0
+            if seed not in images:
+                images[seed] = make_image(seed)
+            plan.append(('imgtocode', '/api/imgtocode', {'img_base64': images[seed]}))
+    return plan[:args.warmup], plan[args.warmup:]
+
+
+def send(url, path, payload, timeout):
+    """POST one request; returns (status, body or None)."""
+    request = urllib.request.Request(
+        url + path,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (OSError, ValueError):
+        return 0, None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """Latency percentiles (ms) per label and overall."""
+    by_label = {}
+    for label, latency, ok, _ in samples:
+        by_label.setdefault(label, []).append((latency, ok))
+    by_label['all'] = [(latency, ok) for _, latency, ok, _ in samples]
+
+    summary = {}
+    for label, values in by_label.items():
+        latencies = sorted(latency for latency, _ in values)
+        summary[label] = {
+            'count': len(values),
+            'errors': sum(1 for _, ok in values if not ok),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        }
+    return summary
+
+
+def run_load(args):
+    with ExitStack() as stack:
+        url = args.url
+        if args.spawn:
+            url = stack.enter_context(spawn_server(args))
+        warmup, plan = build_requests(args)
+
+        def one(item):
+            label, path, payload = item
+            start = time.perf_counter()
+            status, body = send(url, path, payload, args.timeout)
+            return label, time.perf_counter() - start, 200 <= status < 300, body
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(one, warmup))
+            start = time.perf_counter()
+            samples = list(executor.map(one, plan))
+            elapsed = time.perf_counter() - start
+
+    summary = summarize(samples)
+    outcomes = {}
+    for label, _, _, body in samples:
+        if isinstance(body, dict) and 'resources' in body:
+            key = f"{label} -> {body['resources']['terminated_by']}"
+            outcomes[key] = outcomes.get(key, 0) + 1
+
+    print(f"{len(samples)} requests in {elapsed:.2f}s at concurrency {args.concurrency}: "
+          f"{len(samples) / elapsed:.1f} req/s")
+    print(f"{'label':<32} {'n':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for label, row in sorted(summary.items(), key=lambda item: (item[0] == 'all', item[0])):
+        print(f"{label:<32} {row['count']:>5} {row['errors']:>4} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+    if outcomes:
+        print("run outcomes: " + ', '.join(f'{key}: {n}' for key, n in sorted(outcomes.items())))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'config': {key: value for key, value in vars(args).items() if key != 'func'},
+                'requests': len(samples),
+                'elapsed': round(elapsed, 3),
+                'throughput': round(len(samples) / elapsed, 2),
+                'latency': summary,
+                'outcomes': outcomes,
+            }, f, indent=2)
+
+
+@contextmanager
+def spawn_server(args):
+    """
+    Start the API on a free port with the fake LLM backend; yields its URL.
+    With --runners N, submissions run on N runner daemons (EXECUTOR=remote).
+    """
+    env = dict(os.environ, LOG_LEVEL='WARNING', ACCESS_LOG='0')
+    with ExitStack() as stack:
+        if args.runners:
+            urls = [
+                stack.enter_context(spawn_process([sys.executable, 'runner.py'], 'RUNNER_PORT', env, '/health'))
+                for _ in range(args.runners)
+            ]
+            env.update(EXECUTOR='remote', RUNNER_URLS=','.join(urls))
+        env.update(LLM_BACKEND='fake', LLM_FAKE_LATENCY=str(args.llm_latency))
+        if args.server == 'gunicorn':
+            command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+        else:
+            command = [sys.executable, 'app.py']
+        yield stack.enter_context(spawn_process(command, 'PORT', env, '/api/jobs/stats'))
+
+
+@contextmanager
+def spawn_process(command, port_variable, env, ready_path):
+    """Run a server on a free port (passed in `port_variable`) until it answers `ready_path`."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(command, cwd=API_DIR, env=dict(env, **{port_variable: str(port)}))
+    try:
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                with urllib.request.urlopen(url + ready_path, timeout=1):
+                    break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise SystemExit(f"{' '.join(command)} did not start")
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_phases(args):
+    """
+    Time each phase of compile_and_run (the spans it records for the
+    `timings` response field) for each corpus program, in process. Java on
+    the JVM pool compiles and runs in one step, which is reported as execute.
+    """
+    import compile as c
+    from metrics import collect_timings, stop_timings
+
+    if c.PYTHON_ZYGOTE:
+        time.sleep(2)  # let the zygote finish preloading
+    rows = []
+    for language, case, source in load_corpus(args.languages, args.cases):
+        phases = {phase: [] for phase in PHASES}
+        for index in range(args.repeat):
+            code = COMMENTS[language].format(f'run {index}') + source if args.unique else source
+            token = collect_timings()
+            c.compile_and_run(code, language)
+            timings = stop_timings(token)
+            for phase in PHASES:
+                phases[phase].append(timings.get(phase, 0.0))
+        rows.append((f'{language}/{case}', {
+            phase: round(sorted(values)[len(values) // 2], 2) for phase, values in phases.items()
+        }))
+
+    print(f"median ms over {args.repeat} runs")
+    print(f"{'program':<28}" + ''.join(f" {phase:>9}" for phase in PHASES))
+    for name, row in rows:
+        print(f"{name:<28}" + ''.join(f" {row[phase]:>9}" for phase in PHASES))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'repeat': args.repeat, 'median_ms': dict(rows)}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def common(sub):
+        sub.add_argument('--languages', nargs='+', default=list(EXTENSIONS), choices=list(EXTENSIONS))
+        sub.add_argument('--cases', nargs='+', default=CASES, choices=CASES)
+        sub.add_argument('--unique', action='store_true', help='make every payload distinct (defeats caches)')
+        sub.add_argument('--json', help='also write results to this file')
+
+    load = commands.add_parser('load', help='drive the HTTP endpoints')
+    common(load)
+    load.add_argument('--url', default='http://localhost:8080')
+    load.add_argument('--spawn', action='store_true', help='start a server with the fake LLM backend')
+    load.add_argument('--server', choices=['gunicorn', 'dev'], default='gunicorn')
+    load.add_argument('--runners', type=int, default=0, help='run submissions on this many runner daemons (with --spawn)')
+    load.add_argument('--llm-latency', type=float, default=0.5, help='fake LLM latency in seconds (with --spawn)')
+    load.add_argument('--endpoints', nargs='+', default=ENDPOINTS, choices=ENDPOINTS)
+    load.add_argument('--concurrency', type=int, default=8)
+    load.add_argument('--requests', type=int, default=200)
+    load.add_argument('--warmup', type=int, default=10)
+    load.add_argument('--timeout', type=float, default=120)
+    load.set_defaults(func=run_load)
+
+    phases = commands.add_parser('phases', help='in-process per-phase breakdown of compile_and_run')
+    common(phases)
+    phases.add_argument('--repeat', type=int, default=10)
+    phases.set_defaults(func=run_phases)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
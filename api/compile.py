@@ -1,14 +1,23 @@
 import subprocess
 import os
-import shutil
-import secrets
 import tempfile
-import importlib
 import subprocess
-import sys
-import requests
-from contextlib import contextmanager
+import time
+import functools
+import copy
+from contextlib import ExitStack, contextmanager
 import re
+from compile_cache import CompileCache
+from result_cache import ResultCache, looks_deterministic
+from jvm_pool import JvmPool, WorkerCrashed
+from python_pool import PythonPool, ZygoteUnavailable
+from bash_pool import BASH_ENV, BashPool, BashPoolUnavailable
+from packages import PackageMirror
+from manpage import format_manual_page
+from sandbox import RESOURCE_KEYS, Sandbox
+from rundirs import RunDirPool
+from metrics import registry, span
+from ctoolchain import CToolchain, OPT_LEVELS
 
 
 ALLOWED_LANGUAGES = {
@@ -39,54 +48,95 @@ ALLOWED_LANGUAGES = {
 }
 
 MAX_CODE_LENGTH = 50000  # characters
-TEMP_DIR = tempfile.mkdtemp(prefix='secure_compiler_')
 
-def format_manual_page(raw_text):
-    """
-    Format a raw manual page text by:
-    1. Removing backslash-b sequences (\b) and their preceding characters
-    2. Properly indenting sections
-    3. Maintaining line breaks
-    4. Cleaning up unnecessary spaces
-    """
-    # First, handle the \b sequences
-    cleaned_text = ""
-    i = 0
-    while i < len(raw_text):
-        if i + 1 < len(raw_text) and raw_text[i+1:i+2] == '\b':
-            # Skip both the character and the \b
-            i += 2
-        else:
-            cleaned_text += raw_text[i]
-            i += 1
-    
-    # Split into lines
-    lines = cleaned_text.split('\n')
-    formatted_lines = []
-    current_indent = 0
-    
-    for line in lines:
-        # Skip empty lines
-        if not line.strip():
-            formatted_lines.append('')
-            continue
-            
-        # Detect section headers (all caps followed by colon)
-        if any(section in line.upper() for section in ['NAME', 'SYNOPSIS', 'DESCRIPTION', 'EXIT STATUS', 'SEE ALSO', 'STANDARDS']):
-            current_indent = 0
-            formatted_lines.append('\n' + line.strip())
-        else:
-            # Handle normal text lines
-            if line.startswith(' '):
-                # Preserve indentation for option descriptions
-                indent = len(line) - len(line.lstrip())
-                formatted_line = ' ' * indent + line.strip()
-            else:
-                formatted_line = ' ' * current_indent + line.strip()
-            
-            formatted_lines.append(formatted_line)
-    
-    return '\n'.join(formatted_lines)
+# With EXECUTOR=remote this process hands runs to runner daemons (see
+# executors.py), so the warm pools below are off unless asked for
+LOCAL_EXECUTION = os.environ.get('EXECUTOR', 'local') == 'local'
+
+# Run directories live on a RAM-backed filesystem when there is one, and are
+# recycled rather than created and deleted per request
+RUN_DIR_ROOT = os.environ.get(
+    'RUN_DIR_ROOT', '/dev/shm' if os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+)
+RUN_DIR_POOL_SIZE = int(os.environ.get('RUN_DIR_POOL_SIZE', 32))
+TEMP_DIR = tempfile.mkdtemp(prefix='secure_compiler_', dir=RUN_DIR_ROOT)
+run_dirs = RunDirPool(TEMP_DIR, RUN_DIR_POOL_SIZE)
+
+# Interpreted submissions (and batch stdin) are read from in-memory files
+HAVE_MEMFD = hasattr(os, 'memfd_create')
+MEMFD_LANGUAGES = ('python', 'bash') if HAVE_MEMFD else ()
+
+# Compiled artifacts are shared between requests (and server processes)
+COMPILE_CACHE_DIR = os.environ.get(
+    'COMPILE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'write_and_run_compile_cache')
+)
+COMPILE_CACHE_MAX_BYTES = int(os.environ.get('COMPILE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+compile_cache = CompileCache(COMPILE_CACHE_DIR, COMPILE_CACHE_MAX_BYTES)
+
+# Results of deterministic runs are reused for identical requests (opt-in)
+RESULT_CACHE = os.environ.get('RESULT_CACHE', '0') == '1'
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 1000)),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 60 * 60)),
+    confirmations=int(os.environ.get('RESULT_CACHE_CONFIRMATIONS', 2))
+)
+# Response fields about the run itself, dropped when a result is served from the cache
+PER_RUN_FIELDS = ('resources', 'compile_cache', 'runner')
+registry.collect('result_cache_requests_total', 'counter', 'Result cache lookups, by result.',
+                 lambda: {(('result', result),): result_cache.stats()[result]
+                          for result in ('hits', 'misses', 'coalesced', 'bypassed')})
+
+# C builds: optimization level (overridable per request), fast linker and
+# precompiled headers for the usual includes
+C_OPT_LEVEL = os.environ.get('C_OPT_LEVEL', 'O0')
+C_LINKER = os.environ.get('C_LINKER', 'auto')  # auto, lld, gold or default
+C_PCH_HEADERS = os.environ.get(
+    'C_PCH_HEADERS',
+    'stdio.h,stdlib.h,string.h,math.h,ctype.h,stdbool.h,stdint.h,limits.h,time.h,errno.h,assert.h,'
+    'unistd.h,fcntl.h,signal.h,pthread.h,sys/types.h,sys/wait.h,sys/socket.h,netinet/in.h,arpa/inet.h'
+).split(',')
+C_TOOLCHAIN_DIR = os.environ.get('C_TOOLCHAIN_DIR', os.path.join(tempfile.gettempdir(), 'write_and_run_c_toolchain'))
+c_toolchain = CToolchain(C_TOOLCHAIN_DIR, C_PCH_HEADERS, C_LINKER)
+if LOCAL_EXECUTION:
+    c_toolchain.prepare(C_OPT_LEVEL)
+
+# Resource envelope for every run started as a subprocess; cgroup v2 is used
+# when SANDBOX_CGROUP_ROOT points at a delegated, writable cgroup directory
+SANDBOX_MEMORY_BYTES = int(os.environ.get('SANDBOX_MEMORY_BYTES', 1024 * 1024 * 1024))
+SANDBOX_MAX_PROCESSES = int(os.environ.get('SANDBOX_MAX_PROCESSES', 64))
+SANDBOX_FILE_BYTES = int(os.environ.get('SANDBOX_FILE_BYTES', 16 * 1024 * 1024))
+SANDBOX_CGROUP_ROOT = os.environ.get('SANDBOX_CGROUP_ROOT', '')
+sandbox = Sandbox(SANDBOX_MEMORY_BYTES, SANDBOX_MAX_PROCESSES, SANDBOX_FILE_BYTES, SANDBOX_CGROUP_ROOT)
+
+# Warm JVMs that compile and run Java in-process; 0 disables the pool
+JVM_POOL_SIZE = int(os.environ.get('JVM_POOL_SIZE', 2 if LOCAL_EXECUTION else 0))
+JVM_WORKER_MAX_RUNS = int(os.environ.get('JVM_WORKER_MAX_RUNS', 100))
+jvm_pool = JvmPool(JVM_POOL_SIZE, JVM_WORKER_MAX_RUNS, max_output=10000, sandbox=sandbox)
+
+# Third-party packages for Python submissions, installed offline from a wheelhouse
+WHEELHOUSE_DIR = os.environ.get('WHEELHOUSE_DIR', os.path.join(tempfile.gettempdir(), 'write_and_run_wheelhouse'))
+SANDBOX_SITE_DIR = os.environ.get('SANDBOX_SITE_DIR', os.path.join(tempfile.gettempdir(), 'write_and_run_site'))
+package_mirror = PackageMirror(WHEELHOUSE_DIR, SANDBOX_SITE_DIR)
+if LOCAL_EXECUTION:
+    package_mirror.install_all()
+PYTHON_ENV = dict(os.environ, PYTHONPATH=SANDBOX_SITE_DIR)
+
+# Forking Python zygote with common modules already imported
+PYTHON_ZYGOTE = os.environ.get('PYTHON_ZYGOTE', '1' if LOCAL_EXECUTION else '0') == '1'
+PYTHON_PRELOAD_MODULES = os.environ.get(
+    'PYTHON_PRELOAD_MODULES', 'numpy,pandas,math,random,collections,itertools,functools,re,json'
+).split(',')
+PYTHON_MEMORY_BYTES = int(os.environ.get('PYTHON_MEMORY_BYTES', 1024 * 1024 * 1024))
+python_pool = PythonPool(
+    PYTHON_PRELOAD_MODULES, PYTHON_MEMORY_BYTES, max_output=10000, env=PYTHON_ENV, sandbox=sandbox
+)
+if PYTHON_ZYGOTE:
+    python_pool.start()
+
+# Pre-started bash workers (inside the same envelope); 0 starts bash per request
+BASH_POOL_SIZE = int(os.environ.get('BASH_POOL_SIZE', 4 if LOCAL_EXECUTION else 0))
+BASH_WORKER_MAX_JOBS = int(os.environ.get('BASH_WORKER_MAX_JOBS', 200))
+bash_pool = BashPool(BASH_POOL_SIZE, sandbox, max_output=10000, max_jobs=BASH_WORKER_MAX_JOBS)
 
 def sanitize_output(output: str, max_length: int = 10000) -> str:
     """Sanitize and truncate command output."""
@@ -95,19 +145,24 @@ def sanitize_output(output: str, max_length: int = 10000) -> str:
         return ""
     return output[:max_length]
 
-def compile_code(file_path: str, lang_config: dict, run_dir: str) -> tuple:
-    """Compile the source code if needed."""
+def compile_code(file_path: str, lang_config: dict, run_dir: str, flags: list = (), pch: str = None) -> tuple:
+    """Compile the source code if needed; `pch` is a precompiled header for gcc to -include."""
     if not lang_config.get('compile_command'):
         return True, ""
     
     try:
         if lang_config['compile_command'][0] == 'gcc':
+            command = lang_config['compile_command'] + list(flags)
             process = subprocess.run(
-                lang_config['compile_command'] + [file_path],
+                command + (['-include', pch] if pch else []) + [file_path],
                 capture_output=True,
                 text=True,
                 cwd=run_dir
             )
+            if process.returncode != 0 and pch:
+                # The extra headers can clash with the program's own names;
+                # report what a plain compile says
+                process = subprocess.run(command + [file_path], capture_output=True, text=True, cwd=run_dir)
         elif lang_config['compile_command'][0] == 'javac':
             process = subprocess.run(
                 lang_config['compile_command'] + [file_path],
@@ -123,50 +178,340 @@ def compile_code(file_path: str, lang_config: dict, run_dir: str) -> tuple:
     except Exception as e:
         return False, str(e)
 
+@functools.lru_cache(maxsize=None)
+def toolchain_version(language: str) -> str:
+    """Return the version banner of the compiler used for a language."""
+    command = ALLOWED_LANGUAGES[language]['compile_command']
+    if not command:
+        return ""
+    try:
+        process = subprocess.run(
+            [command[0], '--version'],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        return (process.stdout or process.stderr).strip().split('\n')[0]
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+def compile_cached(code: str, file_path: str, language: str, run_dir: str, opt_level: str = None) -> tuple:
+    """
+    Compile through the artifact cache; `opt_level` (one of OPT_LEVELS)
+    applies to C only.
+    Returns (success, error, cache_info) where cache_info reports hit or miss
+    and how much compile time was saved.
+    """
+    lang_config = ALLOWED_LANGUAGES[language]
+    flags, pch = [], None
+    if language == 'c':
+        opt_level = opt_level or C_OPT_LEVEL
+        flags = c_toolchain.flags(opt_level)
+        pch = c_toolchain.precompiled_header(code, opt_level)
+    key = CompileCache.make_key(
+        language, code, lang_config['compile_command'] + flags, toolchain_version(language)
+    )
+
+    with span('compile_cache'):
+        meta = compile_cache.lookup(key, run_dir)
+    if meta is not None:
+        return True, "", {"status": "hit", "compile_time_saved": round(meta['compile_time'], 4)}
+
+    start = time.perf_counter()
+    with span('compile'):
+        success, compile_error = compile_code(file_path, lang_config, run_dir, flags, pch)
+    compile_time = time.perf_counter() - start
+
+    if success:
+        source_name = os.path.basename(file_path)
+        artifacts = sorted(name for name in os.listdir(run_dir) if name != source_name)
+        compile_cache.store(key, run_dir, artifacts, compile_time)
+
+    return success, compile_error, {"status": "miss", "compile_time_saved": 0.0}
+
+def run_java_pooled(class_name: str, code: str, timeout: int, report: dict) -> tuple:
+    """Compile and run a Java submission on the warm JVM pool."""
+    try:
+        with span('execute'):
+            compiled, diagnostics, _, stdout, stderr, resources = jvm_pool.run(class_name, code, timeout)
+    except subprocess.TimeoutExpired:
+        report['resources'] = {
+            "cpu_time": None, "wall_time": timeout, "peak_memory_kb": None, "terminated_by": "timeout"
+        }
+        return {
+            "success": False,
+            "stdout": "",
+            "error": f"Execution timed out after {timeout} seconds"
+        }, 200
+
+    report['runner'] = 'jvm_pool'
+    if resources is not None:
+        report['resources'] = resources
+    if not compiled:
+        return {
+            "success": False,
+            "stdout": "",
+            "error": f"Compilation error: {diagnostics}"
+        }, 200
+
+    return {
+        "success": resources['terminated_by'] == 'exit' and stderr == "",
+        "stdout": sanitize_output(stdout),
+        "error": sanitize_output(stderr),
+    }, 200
+
+def run_python(code: str, run_command: list, run_dir: str, timeout: int, report: dict):
+    """
+    Run a Python submission in a child forked from the zygote, falling back
+    to a fresh interpreter when the zygote is disabled or not ready yet.
+    """
+    if PYTHON_ZYGOTE:
+        try:
+            # The zygote gets the source itself; the path only names it in tracebacks
+            with span('execute'):
+                returncode, stdout, stderr, report['resources'] = python_pool.run(
+                    code, os.path.join(run_dir, 'source.py'), run_dir, timeout
+                )
+            report['runner'] = 'python_zygote'
+            return subprocess.CompletedProcess(run_command, returncode, stdout, stderr)
+        except ZygoteUnavailable:
+            pass
+        except subprocess.TimeoutExpired:
+            report['resources'] = {
+                "cpu_time": None, "wall_time": timeout, "peak_memory_kb": None, "terminated_by": "timeout"
+            }
+            raise
+
+    return run_sandboxed('python', run_command, run_dir, report)
+
+def run_bash(code: str, run_command: list, run_dir: str, timeout: int, report: dict):
+    """Run a Bash submission on a pre-started worker, or in a fresh bash when none is idle."""
+    if BASH_POOL_SIZE > 0:
+        try:
+            with span('execute'):
+                returncode, stdout, stderr, report['resources'] = bash_pool.run(code, run_dir, timeout)
+            report['runner'] = 'bash_pool'
+            return subprocess.CompletedProcess(run_command, returncode, stdout, stderr)
+        except BashPoolUnavailable:
+            pass
+        except subprocess.TimeoutExpired:
+            report['resources'] = {
+                "cpu_time": None, "wall_time": timeout, "peak_memory_kb": None, "terminated_by": "timeout"
+            }
+            raise
+
+    return run_sandboxed('bash', run_command, run_dir, report)
+
+def run_sandboxed(language: str, run_command: list, run_dir: str, report: dict):
+    """
+    Run a submission inside the sandbox; its resource usage goes to
+    report['resources']. Raises subprocess.TimeoutExpired like subprocess.run.
+    """
+    timeout = ALLOWED_LANGUAGES[language]['timeout']
+    process, result = sandbox.run(
+        run_command,
+        run_dir,
+        timeout,
+        env=run_env(language),
+        # The JVM reserves far more address space than it uses
+        limit_address_space=language != 'java',
+        pass_fds=_memfd_args(run_command)
+    )
+    report['resources'] = {key: result[key] for key in RESOURCE_KEYS}
+    if result['terminated_by'] == 'timeout':
+        raise subprocess.TimeoutExpired(run_command, timeout)
+    if result.get('error') and not process.stderr:
+        # Killed for exceeding a limit: say which one
+        process.stderr = result['error']
+    return process
+
+def spawn_run(language: str, run_command: list, run_dir: str, stdin=subprocess.DEVNULL):
+    """Start a submission inside the sandbox, for callers that pump its output themselves."""
+    return sandbox.spawn(
+        run_command,
+        run_dir,
+        ALLOWED_LANGUAGES[language]['timeout'],
+        env=run_env(language),
+        stdin=stdin,
+        limit_address_space=language != 'java',
+        pass_fds=_memfd_args(run_command)
+    )
+
+def _memfd_args(run_command: list) -> tuple:
+    """Descriptors of in-memory sources named in `run_command` (see open_source)."""
+    return tuple(
+        int(arg[len('/proc/self/fd/'):]) for arg in run_command if arg.startswith('/proc/self/fd/')
+    )
+
+def run_env(language: str):
+    """Environment for running a submission (None inherits the server's)."""
+    if language == 'bash':
+        return BASH_ENV
+    return PYTHON_ENV if language == 'python' else None
+
 def get_run_command(language: str, file_path: str, run_dir: str) -> list:
     """Get the appropriate run command based on language."""
     if language == 'java':
         # Extract class name from file path and remove .java extension
         class_name = os.path.basename(file_path)[:-5]
         return ['java', class_name]
-    elif language == 'python':
+    elif language in ('python', 'bash'):
         return ALLOWED_LANGUAGES[language]['command'] + [file_path]
     return ALLOWED_LANGUAGES[language]['command']
 
-def compile_and_run(code, language):
+def compile_and_run(code, language, opt_level=None):
     """
     Securely compile and run code in a temporary directory.
     Returns a dictionary with compilation/execution results.
+    With RESULT_CACHE=1, programs that look deterministic go through the
+    result cache: identical requests share one run, and repeats are answered
+    with the stored result, without the fields that describe a run
+    (PER_RUN_FIELDS), once it has been confirmed. Others run as usual and
+    are reported as skipped.
     """
-    run_dir = os.path.join(TEMP_DIR, secrets.token_hex(16))
-    os.makedirs(run_dir, exist_ok=True)
+    if not RESULT_CACHE:
+        return run_uncached(code, language, opt_level)
+    if not looks_deterministic(code, language):
+        response, status = run_uncached(code, language, opt_level)
+        if status == 200:
+            response['result_cache'] = {"status": "skipped", "run_time_saved": 0.0}
+        return response, status
+
+    def run():
+        start = time.perf_counter()
+        response, status = run_uncached(code, language, opt_level)
+        return (response, status, time.perf_counter() - start), result_outcome(response, status)
+
+    key = ResultCache.make_key(
+        language, code, '', toolchain_version(language),
+        {'opt_level': (opt_level or C_OPT_LEVEL) if language == 'c' else None}
+    )
+    (response, status, run_time), cache_status = result_cache.get_or_run(key, run)
+    response = copy.deepcopy(response)
+    if cache_status == 'hit':
+        # These describe the run that filled the entry; this request had none
+        for field in PER_RUN_FIELDS:
+            response.pop(field, None)
+    if status == 200:
+        response['result_cache'] = {
+            "status": cache_status,
+            "run_time_saved": round(run_time, 4) if cache_status in ('hit', 'coalesced') else 0.0,
+        }
+    return response, status
+
+def result_outcome(response: dict, status: int):
+    """
+    What must match between two runs for a result to be reused, or None when
+    the result should not be cached at all (timeouts, limits, packages
+    still being installed).
+    """
+    if status != 200 or run_outcome(response, status, response) not in ('success', 'error', 'compile_error'):
+        return None
+    if 'ModuleNotFoundError' in response.get('error', ''):
+        return None
+    return response['success'], response['stdout'], response['error']
+
+def run_uncached(code, language, opt_level=None):
+    """compile_and_run without the result cache."""
+    # Extra details (cache status, ...) gathered along the way
+    report = {}
+    with ExitStack() as cleanup:
+        with span('setup'):
+            run_dir = cleanup.enter_context(run_dirs.acquire())
+        try:
+            response, status = _execute(code, language, run_dir, report, cleanup, opt_level)
+        finally:
+            with span('cleanup'):
+                cleanup.close()
+
+    registry.inc('runs_total', language=language, outcome=run_outcome(response, status, report))
+    if status == 200:
+        response.update(report)
+    return response, status
+
+def run_outcome(response: dict, status: int, report: dict) -> str:
+    """Label for runs_total: why the run ended (see sandbox.pump_output's terminated_by)."""
+    if status != 200:
+        return 'rejected'
+    if response.get('error', '').startswith('Compilation error'):
+        return 'compile_error'
+    if response.get('error', '').startswith('Execution timed out'):
+        return 'timeout'
+    resources = report.get('resources')
+    if resources and resources.get('terminated_by') not in (None, 'exit'):
+        return resources['terminated_by']
+    return 'success' if response.get('success') else 'error'
+
+def write_source(code: str, language: str, run_dir: str) -> str:
+    """Write `code` to the file name the language expects; returns its path."""
+    file_extension = ALLOWED_LANGUAGES[language]['file_extension']
+    if language == "java": 
+        match = re.search(r'\bclass\s+(\w+)\s*{', code)
+        class_name = match.group(1)
+        file_path = os.path.join(run_dir, f'{class_name}{file_extension}')
+
+    else:
+        file_path = os.path.join(run_dir, f'source{file_extension}')
+    with open(file_path, 'w') as f:
+        f.write(code)
     
+    # Set execute permission for bash scripts
+    if language == 'bash':
+        os.chmod(file_path, 0o755)
+    return file_path
+
+@contextmanager
+def open_source(code: str, language: str, run_dir: str):
+    """
+    Yield a path the run command can read `code` from. Interpreted languages
+    get /proc/self/fd/N of an in-memory file, so the run directory stays
+    empty; the descriptor is closed on exit. Others go through write_source.
+    """
+    if language not in MEMFD_LANGUAGES:
+        yield write_source(code, language, run_dir)
+        return
+    with memory_file('source' + ALLOWED_LANGUAGES[language]['file_extension'], code) as fd:
+        yield f'/proc/self/fd/{fd}'
+
+@contextmanager
+def memory_file(name: str, text: str):
+    """Yield the descriptor of an in-memory file holding `text`, positioned at its start."""
+    fd = os.memfd_create(name)
+    try:
+        data = text.encode('utf-8')
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+        os.lseek(fd, 0, os.SEEK_SET)
+        yield fd
+    finally:
+        os.close(fd)
+
+def _execute(code, language, run_dir, report, cleanup, opt_level=None):
+    """Write, compile and run `code` inside `run_dir`; `cleanup` closes the source afterwards."""
     try:
         # Get the configuration for the specified language
         lang_config = ALLOWED_LANGUAGES.get(language)
         if not lang_config:
             return {"error": f"Language '{language}' not supported."}, 400
         
-        file_extension = lang_config['file_extension']
         timeout = lang_config['timeout']
+        with span('write'):
+            file_path = cleanup.enter_context(open_source(code, language, run_dir))
 
-        if language == "java": 
-            match = re.search(r'\bclass\s+(\w+)\s*{', code)
-            class_name = match.group(1)
-            file_path = os.path.join(run_dir, f'{class_name}{file_extension}')
+        # Java goes to a warm JVM when one is available; it compiles in memory,
+        # without the compile cache
+        if language == 'java' and jvm_pool.size > 0 and jvm_pool.available:
+            try:
+                return run_java_pooled(os.path.basename(file_path)[:-5], code, timeout, report)
+            except WorkerCrashed:
+                pass  # fall back to javac + java
 
-        else:
-            file_path = os.path.join(run_dir, f'source{file_extension}')
-        with open(file_path, 'w') as f:
-            f.write(code)
-        
-        # Set execute permission for bash scripts
-        if language == 'bash':
-            os.chmod(file_path, 0o755)
-        
         # Compile if necessary
         if lang_config.get('compile_command'):
-            success, compile_error = compile_code(file_path, lang_config, run_dir)
+            success, compile_error, report['compile_cache'] = compile_cached(
+                code, file_path, language, run_dir, opt_level
+            )
             if not success:
                 return {
                     "success": False,
@@ -180,32 +525,25 @@ def compile_and_run(code, language):
         # Special handling for Python
         if language == 'python':
             try:
-                process = subprocess.run(
-                    run_command,
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    cwd=run_dir
-                )
+                process = run_python(code, run_command, run_dir, timeout, report)
                 
-                # Handle Python module installation if needed
+                # Missing third-party modules come from the local wheelhouse, never from PyPI
                 if "ModuleNotFoundError" in process.stderr:
-                    if not check_and_install(process.stderr.split("'")[1]):
+                    module = process.stderr.split("'")[1]
+                    with span('install'):
+                        status = package_mirror.resolve(module)
+                    if status == 'installing':
                         return {
                             "success": False,
                             "stdout": "",
-                            "error": "ModuleNotFoundError: Something wrong when installing the module"
+                            "error": f"ModuleNotFoundError: '{module}' is being installed, try again in a few seconds"
                         }, 200
-                    
-                    process = subprocess.run(
-                        run_command,
-                        capture_output=True,
-                        text=True,
-                        timeout=timeout,
-                        cwd=run_dir
-                    )
-
-                if process.returncode != 0:
+                    if status == 'installed':
+                        # Finished installing after this run started
+                        process = run_python(code, run_command, run_dir, timeout, report)
+
+                # A zygote child cut off at the output limit can still exit with 0
+                if process.returncode != 0 or report['resources']['terminated_by'] != 'exit':
                     return {
                         "success": False,
                         "stdout": sanitize_output(process.stdout),
@@ -228,25 +566,13 @@ def compile_and_run(code, language):
         # Handle other languages
         else:
             try:
-                if language == "bash": 
-                    process = subprocess.run(
-                        code,
-                        capture_output=True,
-                        text=True,
-                        shell=True,
-                        timeout=timeout,
-         
-                    )
-                    process.stdout = format_manual_page(process.stdout)
+                if language == "bash":
+                    process = run_bash(code, run_command, run_dir, timeout, report)
+                    with span('format'):
+                        process.stdout = format_manual_page(process.stdout)
                 else:
-                    process = subprocess.run(
-                        run_command,
-                        capture_output=True,
-                        text=True,
-                        timeout=timeout,
-                        cwd=run_dir
-                    )
-            
+                    process = run_sandboxed(language, run_command, run_dir, report)
+
                 if process.stderr != "":
                     return {
                         "success": False,
@@ -274,42 +600,3 @@ def compile_and_run(code, language):
             "stdout": "",
             "error": str(e)
         }, 200
-    finally:
-        shutil.rmtree(run_dir, ignore_errors=True)
-
-def check_and_install(package_name):
-    """
-    Check if a package is installed. If not, check its size on PyPI and install it if under 5MB.
-    """
-    try:
-        # Check if the package is already installed
-        importlib.import_module(package_name)
-        print(f"'{package_name}' is already installed.")
-        return False
-    except ImportError:
-        print(f"'{package_name}' is not installed. Checking size...")
-
-
-    # Check package size from PyPI
-    try:
-        response = requests.get(f"https://pypi.org/pypi/{package_name}/json", timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        # Get size of the latest release's wheel file
-        urls = data["releases"][data["info"]["version"]]
-        total_size = sum(file["size"] for file in urls if file["packagetype"] == "bdist_wheel")
-
-        size_in_mb = total_size / (1024 * 1024)
-        if size_in_mb > 1000:
-            print(f"'{package_name}' is too large ({size_in_mb:.2f} MB). Not installing.")
-            return
-        print(f"'{package_name}' is {size_in_mb:.2f} MB. Proceeding with installation...")
-
-        # Install the package
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-        print(f"'{package_name}' installed successfully.")
-        return True
-    except Exception as e:
-        print(f"Error checking or installing '{package_name}': {e}")
-        return False
-
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import threading
+import time
+
+
+class CompileCache:
+    """
+    Content-addressed store for compiled artifacts (a.out, .class files).
+
+    Entries live in `root/<key>/` where the key is a hash of everything that
+    can change the compiler output. The directory mtime doubles as the LRU
+    timestamp, so several server processes can share one cache directory.
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def make_key(language: str, source: str, flags: list, toolchain: str) -> str:
+        """Hash the inputs that determine the compiled output."""
+        digest = hashlib.sha256()
+        for part in (language, toolchain, json.dumps(flags), source):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def lookup(self, key: str, run_dir: str):
+        """
+        Copy the cached artifacts for `key` into `run_dir`.
+        Returns the entry metadata on a hit, None on a miss.
+        """
+        entry = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(entry, self.META_FILE)) as f:
+                meta = json.load(f)
+            for name in meta['artifacts']:
+                shutil.copy2(os.path.join(entry, name), os.path.join(run_dir, name))
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            # Missing, half-written or concurrently evicted entry
+            return None
+        return meta
+
+    def store(self, key: str, run_dir: str, artifacts: list, compile_time: float):
+        """Save freshly compiled artifacts from `run_dir` under `key`."""
+        tmp_entry = os.path.join(self.root, f'.tmp-{secrets.token_hex(8)}')
+        try:
+            os.makedirs(tmp_entry)
+            size = 0
+            for name in artifacts:
+                target = os.path.join(tmp_entry, name)
+                shutil.copy2(os.path.join(run_dir, name), target)
+                size += os.path.getsize(target)
+            with open(os.path.join(tmp_entry, self.META_FILE), 'w') as f:
+                json.dump({
+                    'artifacts': artifacts,
+                    'compile_time': compile_time,
+                    'created': time.time(),
+                }, f)
+            # Atomic publish; losing a race against an identical entry is fine
+            os.rename(tmp_entry, os.path.join(self.root, key))
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return
+
+        with self._lock:
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """Yield (path, size, last_used) for every published entry."""
+        for name in os.listdir(self.root):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                size = sum(
+                    entry.stat().st_size for entry in os.scandir(path)
+                    if entry.name != self.META_FILE
+                )
+                yield path, size, os.stat(path).st_mtime
+            except OSError:
+                continue
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            doomed = os.path.join(self.root, f'.evict-{secrets.token_hex(8)}')
+            try:
+                os.rename(path, doomed)
+            except OSError:
+                continue
+            shutil.rmtree(doomed, ignore_errors=True)
+            total -= size
+        self._size = total
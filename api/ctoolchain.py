@@ -0,0 +1,146 @@
+import logging
+import os
+import re
+import secrets
+import subprocess
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+OPT_LEVELS = ('O0', 'O1', 'O2', 'O3', 'Os', 'Og')
+
+# Linkers tried, fastest first, when `linker` is 'auto'
+FAST_LINKERS = ('lld', 'gold')
+
+PCH_HEADER = 'common.h'
+# Loading the PCH costs about as much as parsing stdio.h alone; it pays off
+# once a program includes a few headers
+PCH_MIN_INCLUDES = 3
+_INCLUDE = re.compile(r'^\s*#\s*include\s*<([^>]+)>', re.MULTILINE)
+_DIRECTIVE = re.compile(r'^\s*#\s*(\w+)', re.MULTILINE)
+
+
+class CToolchain:
+    """
+    gcc flags for C submissions: an optimization level chosen per request, a
+    faster linker than ld.bfd when one is installed, and precompiled headers.
+
+    The precompiled header includes `headers`, the set most submissions
+    start with. It is passed with `-include`, so it is only used for sources
+    whose system includes all come from that set and that do not define
+    anything before including them; gcc only accepts a PCH built at the same
+    -O level, so there is one per level, built in the background on first
+    use. A stale or unusable PCH makes gcc read the headers as text, so it
+    costs speed, never correctness.
+    """
+
+    def __init__(self, directory: str, headers: list, linker: str = 'auto'):
+        self.directory = directory
+        self.headers = [header for header in headers if header]
+        self.linker = _find_linker(linker)
+        self._lock = threading.Lock()
+        self._ready = {}      # opt level -> path of the header next to its .gch, or None if it failed
+        self._building = {}   # opt level -> thread building its header
+        os.makedirs(directory, exist_ok=True)
+
+    def flags(self, opt_level: str) -> list:
+        """Flags that change the compiled output (part of the compile cache key)."""
+        flags = [f'-{opt_level}']
+        if self.linker:
+            flags.append(f'-fuse-ld={self.linker}')
+        return flags
+
+    def precompiled_header(self, code: str, opt_level: str):
+        """Path to pass with -include when compiling `code`, or None."""
+        if not self.headers or not self._covers(code):
+            return None
+        with self._lock:
+            if opt_level in self._ready:
+                return self._ready[opt_level]
+        self.prepare(opt_level)
+        return None
+
+    def prepare(self, opt_level: str, wait: bool = False):
+        """Build the precompiled header for `opt_level` in the background, once."""
+        with self._lock:
+            builder = self._building.get(opt_level)
+            if builder is None and opt_level not in self._ready and self.headers:
+                builder = self._building[opt_level] = threading.Thread(
+                    target=self._build, args=(opt_level,), name=f'pch-{opt_level}', daemon=True
+                )
+                builder.start()
+        if wait and builder is not None:
+            builder.join()
+
+    def _covers(self, code: str) -> bool:
+        includes = set(_INCLUDE.findall(code))
+        if len(includes) < PCH_MIN_INCLUDES or not includes <= set(self.headers):
+            return False
+        # `#define _GNU_SOURCE` and the like must come before the headers
+        first = _DIRECTIVE.search(code)
+        return first is not None and first.group(1) == 'include'
+
+    def _build(self, opt_level: str):
+        level_dir = os.path.join(self.directory, opt_level)
+        header = os.path.join(level_dir, PCH_HEADER)
+        pch = None
+        try:
+            os.makedirs(level_dir, exist_ok=True)
+            contents = ''.join(f'#include <{name}>\n' for name in self.headers)
+            # Other server processes may share the directory: reuse a matching build
+            if _read(header) != contents or not os.path.exists(header + '.gch'):
+                tmp = os.path.join(level_dir, f'.tmp-{secrets.token_hex(8)}')
+                with open(tmp + '.h', 'w') as f:
+                    f.write(contents)
+                process = subprocess.run(
+                    ['gcc', f'-{opt_level}', '-x', 'c-header', tmp + '.h', '-o', tmp + '.gch'],
+                    capture_output=True, text=True, timeout=60
+                )
+                try:
+                    if process.returncode != 0:
+                        raise OSError(process.stderr.strip())
+                    os.replace(tmp + '.gch', header + '.gch')
+                    os.replace(tmp + '.h', header)
+                finally:
+                    for leftover in (tmp + '.h', tmp + '.gch'):
+                        if os.path.exists(leftover):
+                            os.unlink(leftover)
+            pch = header
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("Precompiled header not built", extra={'opt_level': opt_level, 'error': str(e)})
+        with self._lock:
+            self._ready[opt_level] = pch
+            self._building.pop(opt_level, None)
+
+
+def _find_linker(linker: str):
+    """The -fuse-ld value to use, or None for gcc's default linker."""
+    if linker == 'default':
+        return None
+    candidates = FAST_LINKERS if linker == 'auto' else (linker,)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'probe.c')
+        with open(source, 'w') as f:
+            f.write('int main(void) { return 0; }\n')
+        for candidate in candidates:
+            try:
+                process = subprocess.run(
+                    ['gcc', f'-fuse-ld={candidate}', source, '-o', os.path.join(directory, 'probe')],
+                    capture_output=True, timeout=30
+                )
+            except (OSError, subprocess.SubprocessError):
+                return None
+            if process.returncode == 0:
+                return candidate
+    if linker != 'auto':
+        logger.warning("Linker not usable, using gcc's default", extra={'linker': linker})
+    return None
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return ''
@@ -0,0 +1,231 @@
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+from batch import run_batch
+from compile import compile_and_run, result_cache
+from metrics import span
+from streaming import stream_compile_and_run
+
+logger = logging.getLogger(__name__)
+
+
+class RunnerUnavailable(Exception):
+    """No runner could take the request."""
+
+
+class LocalExecutor:
+    """Runs submissions in this process."""
+
+    def compile_and_run(self, code, language, opt_level=None):
+        return compile_and_run(code, language, opt_level)
+
+    def run_batch(self, code, language, cases, opt_level=None):
+        return run_batch(code, language, cases, opt_level)
+
+    def stream_compile_and_run(self, code, language, opt_level=None):
+        return stream_compile_and_run(code, language, opt_level)
+
+    def stats(self) -> dict:
+        return {'backend': 'local', 'result_cache': result_cache.stats()}
+
+    def close(self):
+        pass
+
+
+class Runner:
+    """What the API knows about one runner daemon (see runner.py)."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True  # until a health check says otherwise
+        self.load = 0        # queued + running, as last reported by the runner
+        self.capacity = 1
+        self.in_flight = 0   # requests this process has sent and not yet seen answered
+        self.requests = 0
+        self.failures = 0
+
+    def score(self) -> float:
+        return (self.load + self.in_flight) / self.capacity
+
+    def to_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'load': self.load,
+            'capacity': self.capacity,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+        }
+
+
+class RemoteExecutor:
+    """
+    Runs submissions on runner daemons over JSON/HTTP, so execution capacity
+    scales apart from the API tier.
+
+    Each request goes to the healthy runner with the lowest load (its last
+    reported queue depth plus what this process has in flight, relative to
+    its capacity). A runner that refuses connections or drops one is marked
+    down and the request moves on to the next; a busy runner (503) is
+    skipped without being marked down. Background health checks bring
+    runners back. Submissions are sandboxed and leave nothing behind, so
+    re-sending one after a runner died mid-run is safe; a runner that is
+    still working after `timeout` is not retried.
+    """
+
+    def __init__(self, urls: list, token: str = '', health_interval: float = 2.0, timeout: float = 120.0):
+        self.runners = [Runner(url) for url in urls]
+        self.token = token
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        threading.Thread(target=self._check_health, name='runner-health', daemon=True).start()
+
+    def compile_and_run(self, code, language, opt_level=None):
+        payload = {'code': code, 'language': language, 'opt_level': opt_level}
+        try:
+            body = self._call('/compile', payload)
+        except RunnerUnavailable as e:
+            return {"success": False, "stdout": "", "error": str(e)}, 503
+        return body['response'], body['status']
+
+    def run_batch(self, code, language, cases, opt_level=None):
+        payload = {'code': code, 'language': language, 'cases': cases, 'opt_level': opt_level}
+        try:
+            body = self._call('/batch', payload)
+        except RunnerUnavailable as e:
+            return {"success": False, "error": str(e), "cases": []}, 503
+        return body['response'], body['status']
+
+    def stream_compile_and_run(self, code, language, opt_level=None):
+        """Relay the runner's event stream; failover only happens before the first event."""
+        payload = {'code': code, 'language': language, 'opt_level': opt_level}
+        try:
+            runner, response = self._open('/stream', payload)
+        except RunnerUnavailable as e:
+            yield 'exit', {"success": False, "error": str(e)}
+            return
+        event = None
+        try:
+            for raw in response:
+                line = raw.decode('utf-8').rstrip('\n')
+                if line.startswith('event: '):
+                    event = line[len('event: '):]
+                elif line.startswith('data: '):
+                    yield event, json.loads(line[len('data: '):])
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self._failed(runner, e)
+            yield 'exit', {"success": False, "error": "Lost the connection to the runner"}
+        finally:
+            response.close()
+            self._finished(runner)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'backend': 'remote', 'runners': [runner.to_dict() for runner in self.runners]}
+
+    def close(self):
+        self._stopped.set()
+
+    def _call(self, path: str, payload: dict) -> dict:
+        with span('remote'):
+            runner, response = self._open(path, payload)
+            try:
+                return json.loads(response.read())
+            except socket.timeout:
+                raise RunnerUnavailable("The runner did not answer in time")
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self._failed(runner, e)
+                raise RunnerUnavailable("Lost the connection to the runner")
+            finally:
+                response.close()
+                self._finished(runner)
+
+    def _open(self, path: str, payload: dict):
+        """Send `payload` to the best runner that accepts it; returns (runner, response)."""
+        data = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        for runner in self._candidates():
+            with self._lock:
+                runner.in_flight += 1
+                runner.requests += 1
+            request = urllib.request.Request(runner.url + path, data=data, headers=headers)
+            try:
+                return runner, urllib.request.urlopen(request, timeout=self.timeout)
+            except urllib.error.HTTPError as e:
+                e.close()
+                self._finished(runner)
+                if e.code != 503:
+                    self._failed(runner, e)
+            except socket.timeout:
+                self._finished(runner)
+                raise RunnerUnavailable("The runner did not answer in time")
+            except (OSError, http.client.HTTPException) as e:
+                self._finished(runner)
+                self._failed(runner, e)
+        raise RunnerUnavailable("No runner is available, try again in a few seconds")
+
+    def _candidates(self) -> list:
+        """Runners in the order to try them: healthy ones by load, then the rest."""
+        with self._lock:
+            runners = list(self.runners)
+            random.shuffle(runners)  # spread ties
+            return sorted(runners, key=lambda runner: (not runner.healthy, runner.score()))
+
+    def _finished(self, runner: Runner):
+        with self._lock:
+            runner.in_flight -= 1
+
+    def _failed(self, runner: Runner, error: Exception):
+        with self._lock:
+            runner.failures += 1
+            was_healthy, runner.healthy = runner.healthy, False
+        if was_healthy:
+            logger.warning("Runner marked down", extra={'runner': runner.url, 'error': str(error)})
+
+    def _check_health(self):
+        while not self._stopped.wait(self.health_interval):
+            for runner in self.runners:
+                try:
+                    with urllib.request.urlopen(runner.url + '/health', timeout=1) as response:
+                        health = json.loads(response.read())
+                    # Anything but a runner's answer (e.g. a proxy page) counts as down
+                    load = int(health['queue_depth']) + int(health['running'])
+                    capacity = max(int(health['capacity']), 1)
+                except (OSError, http.client.HTTPException, ValueError, KeyError, TypeError) as e:
+                    if runner.healthy:
+                        self._failed(runner, e)
+                    continue
+                with self._lock:
+                    was_healthy, runner.healthy = runner.healthy, True
+                    runner.load = load
+                    runner.capacity = capacity
+                if not was_healthy:
+                    logger.info("Runner is back", extra={'runner': runner.url})
+
+
+def create_executor():
+    """The executor selected by EXECUTOR (local or remote)."""
+    if os.environ.get('EXECUTOR', 'local') != 'remote':
+        return LocalExecutor()
+    urls = [url for url in os.environ.get('RUNNER_URLS', '').split(',') if url]
+    if not urls:
+        raise RuntimeError("EXECUTOR=remote needs RUNNER_URLS")
+    return RemoteExecutor(
+        urls,
+        token=os.environ.get('RUNNER_TOKEN', ''),
+        health_interval=float(os.environ.get('RUNNER_HEALTH_INTERVAL', 2)),
+        timeout=float(os.environ.get('RUNNER_TIMEOUT', 120))
+    )
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+# Production server: gunicorn -c gunicorn.conf.py app:app
+#
+# Each worker process imports the app on its own and so runs its own JVM pool,
+# Python zygote and job scheduler (the pools are threads and child processes,
+# which do not survive a fork, hence no preload_app). Threads suit the request
+# mix: LLM calls wait on the network and submissions run in child processes,
+# so a handler thread spends most of its time blocked either way.
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('WEB_WORKERS', min(4, os.cpu_count() or 1)))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 16))
+
+# Streamed responses and long polls keep a connection busy for a while
+timeout = 120
+keepalive = 5
+
+# On SIGTERM workers stop accepting, finish in-flight requests, then drain
+# async jobs (see worker_exit); the master kills whatever is left after this
+graceful_timeout = int(os.environ.get('SHUTDOWN_TIMEOUT', 30))
+
+accesslog = '-' if os.environ.get('ACCESS_LOG', '1') == '1' else None
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+# Async jobs are polled through whichever worker gets the request, so their
+# state is shared through the filesystem
+os.environ.setdefault('JOB_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'write_and_run_jobs'))
+
+# Likewise metrics: each worker writes snapshots that /metrics adds up
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'write_and_run_metrics'))
+
+
+def on_starting(server):
+    # Counters start from zero with each server, not with each worker
+    import shutil
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown(graceful_timeout)
@@ -0,0 +1,46 @@
+import base64
+import binascii
+import hashlib
+import io
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+def preprocess(img_base64: str, max_dimension: int, quality: int) -> tuple:
+    """
+    Shrink a photo of handwritten code before it is sent to the vision model.
+
+    Applies EXIF rotation, fits the image within `max_dimension` pixels,
+    converts to grayscale, stretches the contrast and re-encodes as JPEG.
+    Returns (jpeg_base64, digest); the digest is an exact SHA-256 of the
+    cleaned pixels, so re-uploads of the same photo share it, while images
+    that differ by a single character of code never do. Raises ValueError if
+    the data is not a readable image, or has more pixels than Pillow will
+    decode (Image.MAX_IMAGE_PIXELS, against decompression bombs).
+    """
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(img_base64)))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('L')
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Image too large to preprocess: {e}") from e
+    except (binascii.Error, UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Could not decode image: {e}") from e
+
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    # Clip the darkest/brightest 1% so pencil on grey paper becomes black on white
+    image = ImageOps.autocontrast(image, cutoff=1)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode('ascii'), pixel_digest(image)
+
+
+def pixel_digest(image: Image.Image) -> str:
+    """
+    SHA-256 over the image size and raw pixels. Perceptual hashes are not
+    used: two renderings of code that differ only in `<` vs `<=` hash alike.
+    """
+    digest = hashlib.sha256(f'{image.mode}:{image.width}x{image.height}:'.encode('ascii'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
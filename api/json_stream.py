@@ -0,0 +1,125 @@
+class FieldStreamParser:
+    """
+    Incrementally parses a flat JSON object as its text arrives in chunks.
+
+    feed() returns (key, fragment, complete) tuples for top-level string
+    values: fragments are already unescaped and, concatenated, give the
+    full value; the last one for a key has complete=True. Non-string values
+    are skipped. Anything before the opening brace (stray prose, a code
+    fence) is ignored.
+    """
+
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self._state = 'start'
+        self._key = []
+        self._current_key = None
+        self._escape = None       # None, '' after a backslash, or 'uXXXX' in progress
+        self._high_surrogate = None
+        self._skip_depth = 0
+        self._skip_in_string = False
+        self._skip_escape = False
+
+    def feed(self, text: str) -> list:
+        events = []
+        value = []
+        for char in text:
+            state = self._state
+            if state == 'start':
+                if char == '{':
+                    self._state = 'before_key'
+            elif state == 'before_key':
+                if char == '"':
+                    self._key = []
+                    self._state = 'key'
+                elif char == '}':
+                    self._state = 'done'
+            elif state == 'key':
+                if self._escape is not None:
+                    decoded = self._unescape(char)
+                    if decoded:
+                        self._key.append(decoded)
+                elif char == '\\':
+                    self._escape = ''
+                elif char == '"':
+                    self._current_key = ''.join(self._key)
+                    self._state = 'colon'
+                else:
+                    self._key.append(char)
+            elif state == 'colon':
+                if char == ':':
+                    self._state = 'before_value'
+            elif state == 'before_value':
+                if char == '"':
+                    self._state = 'string'
+                elif not char.isspace():
+                    self._state = 'skip'
+                    self._skip_depth = 1 if char in '[{' else 0
+                    self._skip_in_string = False
+            elif state == 'string':
+                if self._escape is not None:
+                    decoded = self._unescape(char)
+                    if decoded:
+                        value.append(decoded)
+                elif char == '\\':
+                    self._escape = ''
+                elif char == '"':
+                    events.append((self._current_key, ''.join(value), True))
+                    value = []
+                    self._state = 'after_value'
+                else:
+                    value.append(char)
+            elif state == 'skip':
+                if self._skip_in_string:
+                    if self._skip_escape:
+                        self._skip_escape = False
+                    elif char == '\\':
+                        self._skip_escape = True
+                    elif char == '"':
+                        self._skip_in_string = False
+                elif char == '"':
+                    self._skip_in_string = True
+                elif char in '[{':
+                    self._skip_depth += 1
+                elif char in ']}':
+                    if self._skip_depth == 0:
+                        self._state = 'done'
+                    else:
+                        self._skip_depth -= 1
+                elif char == ',' and self._skip_depth == 0:
+                    self._state = 'before_key'
+            elif state == 'after_value':
+                if char == ',':
+                    self._state = 'before_key'
+                elif char == '}':
+                    self._state = 'done'
+
+        if value:
+            events.append((self._current_key, ''.join(value), False))
+        return events
+
+    def _unescape(self, char: str) -> str:
+        """Consume one character of an escape sequence; returns decoded text, if any."""
+        if self._escape == '':
+            if char == 'u':
+                self._escape = 'u'
+                return ''
+            self._escape = None
+            return self.ESCAPES.get(char, char)
+
+        self._escape += char
+        if len(self._escape) < 5:
+            return ''
+        try:
+            code = int(self._escape[1:], 16)
+        except ValueError:
+            code = 0xFFFD
+        self._escape = None
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ''
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
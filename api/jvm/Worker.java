@@ -0,0 +1,353 @@
+import javax.tools.Diagnostic;
+import javax.tools.DiagnosticCollector;
+import javax.tools.FileObject;
+import javax.tools.ForwardingJavaFileManager;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileManager;
+import javax.tools.JavaFileObject;
+import javax.tools.SimpleJavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.FileDescriptor;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.io.StringWriter;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.lang.reflect.Modifier;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.Collections;
+import java.util.HashMap;
+import java.util.HashSet;
+import java.util.Locale;
+import java.util.Map;
+import java.util.Set;
+
+/**
+ * Long-lived JVM that compiles and runs submissions in-process for jvm_pool.py.
+ *
+ * Frames on stdin/stdout are length-prefixed (big-endian int + UTF-8 bytes):
+ *   request:          class name, source
+ *   compile response: int status (0 ok, 1 error), diagnostics
+ *   run response:     int exit code, stdout, stderr, int reusable   (only when compiled)
+ *
+ * Every run gets a fresh class loader, so static state never leaks between
+ * submissions. `reusable` is 0 when the program left threads running
+ * (daemons and executors included); the pool then retires the worker. Outside
+ * a run System.out and System.err discard everything, so such threads can
+ * never write into the protocol stream. The worker exits when stdin is closed.
+ */
+public class Worker {
+
+    private static final String WARMUP_CLASS = "Warmup";
+    private static final String WARMUP_SOURCE =
+        "public class Warmup { public static void main(String[] a) { System.out.println(a.length); } }";
+
+    private static final JavaCompiler COMPILER = ToolProvider.getSystemJavaCompiler();
+    private static final PrintStream REAL_ERR = System.err;
+    private static final PrintStream DISCARD = new PrintStream(new OutputStream() {
+        @Override
+        public void write(int b) {
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) {
+        }
+    }, true);
+
+    private static int maxOutput = 1 << 20;
+    private static volatile boolean trapExit = false;
+
+    public static void main(String[] args) throws IOException {
+        if (args.length > 0) {
+            maxOutput = Integer.parseInt(args[0]);
+        }
+        installExitTrap();
+        System.setOut(DISCARD);
+        System.setErr(DISCARD);
+
+        DataInputStream in = new DataInputStream(new FileInputStream(FileDescriptor.in));
+        DataOutputStream out = new DataOutputStream(new FileOutputStream(FileDescriptor.out));
+
+        // Pay for javac and reflection class loading before the first request
+        Map<String, byte[]> warm = new HashMap<>();
+        if (compile(WARMUP_CLASS, WARMUP_SOURCE, warm, new StringWriter())) {
+            execute(WARMUP_CLASS, warm, new ByteArrayOutputStream(), new ByteArrayOutputStream(), liveThreads());
+        }
+
+        while (true) {
+            String className;
+            String source;
+            try {
+                className = readString(in);
+                source = readString(in);
+            } catch (EOFException e) {
+                return;
+            }
+
+            Map<String, byte[]> classes = new HashMap<>();
+            StringWriter diagnostics = new StringWriter();
+            boolean compiled = compile(className, source, classes, diagnostics);
+            out.writeInt(compiled ? 0 : 1);
+            writeBytes(out, diagnostics.toString().getBytes(StandardCharsets.UTF_8));
+            out.flush();
+            if (!compiled) {
+                continue;
+            }
+
+            ByteArrayOutputStream stdout = new CappedOutputStream(maxOutput);
+            ByteArrayOutputStream stderr = new CappedOutputStream(maxOutput);
+            Set<Thread> before = liveThreads();
+            int exitCode = execute(className, classes, stdout, stderr, before);
+            out.writeInt(exitCode);
+            writeBytes(out, stdout.toByteArray());
+            writeBytes(out, stderr.toByteArray());
+            out.writeInt(leftThreads(before) ? 0 : 1);
+            out.flush();
+        }
+    }
+
+    /** Compile a single source file into memory, collecting diagnostics. */
+    private static boolean compile(String className, String source, Map<String, byte[]> classes,
+                                   StringWriter diagnostics) {
+        if (COMPILER == null) {
+            diagnostics.write("No Java compiler available in this runtime");
+            return false;
+        }
+        DiagnosticCollector<JavaFileObject> collector = new DiagnosticCollector<>();
+        StandardJavaFileManager standard = COMPILER.getStandardFileManager(collector, Locale.ROOT, StandardCharsets.UTF_8);
+        MemoryFileManager files = new MemoryFileManager(standard, classes);
+        JavaFileObject unit = new SourceFile(className, source);
+
+        boolean ok = COMPILER.getTask(null, files, collector, null, null, Collections.singletonList(unit)).call();
+        for (Diagnostic<? extends JavaFileObject> d : collector.getDiagnostics()) {
+            String name = d.getSource() == null ? "" : className + ".java:" + d.getLineNumber() + ": ";
+            String kind = d.getKind() == Diagnostic.Kind.ERROR ? "error" : "warning";
+            diagnostics.write(name + kind + ": " + d.getMessage(Locale.ROOT) + "\n");
+        }
+        return ok;
+    }
+
+    /** Run `className.main` with redirected streams, mimicking the `java` launcher. */
+    private static int execute(String className, Map<String, byte[]> classes,
+                               ByteArrayOutputStream stdout, ByteArrayOutputStream stderr, Set<Thread> before) {
+        PrintStream savedOut = System.out;
+        PrintStream savedErr = System.err;
+        InputStream savedIn = System.in;
+        PrintStream userOut = new PrintStream(stdout, true);
+        PrintStream userErr = new PrintStream(stderr, true);
+
+        System.setOut(userOut);
+        System.setErr(userErr);
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+        int exitCode = 0;
+        try {
+            ClassLoader loader = new MemoryClassLoader(classes);
+            Method main = loader.loadClass(className).getMethod("main", String[].class);
+            if (!Modifier.isStatic(main.getModifiers())) {
+                throw new NoSuchMethodException("main");
+            }
+            main.setAccessible(true);
+            trapExit = true;
+            main.invoke(null, (Object) new String[0]);
+            joinUserThreads(before);
+        } catch (InvocationTargetException e) {
+            Throwable cause = e.getCause();
+            if (cause instanceof ExitTrap) {
+                exitCode = ((ExitTrap) cause).status;
+            } else {
+                userErr.print("Exception in thread \"main\" ");
+                cause.printStackTrace(userErr);
+                exitCode = 1;
+            }
+        } catch (ExitTrap e) {
+            exitCode = e.status;
+        } catch (ClassNotFoundException | NoSuchMethodException e) {
+            userErr.println("Error: Main method not found in class " + className
+                + ", please define the main method as:\n   public static void main(String[] args)");
+            exitCode = 1;
+        } catch (Throwable e) {
+            e.printStackTrace(userErr);
+            exitCode = 1;
+        } finally {
+            trapExit = false;
+            userOut.flush();
+            userErr.flush();
+            System.setOut(savedOut);
+            System.setErr(savedErr);
+            System.setIn(savedIn);
+        }
+        return exitCode;
+    }
+
+    /** Like the real launcher, wait for non-daemon threads started by the program. */
+    private static void joinUserThreads(Set<Thread> before) throws InterruptedException {
+        for (Thread thread : Thread.getAllStackTraces().keySet()) {
+            if (!before.contains(thread) && !thread.isDaemon() && thread != Thread.currentThread()) {
+                thread.join();
+            }
+        }
+    }
+
+    private static Set<Thread> liveThreads() {
+        return new HashSet<>(Thread.getAllStackTraces().keySet());
+    }
+
+    /** Whether a thread the program started (daemon or not) is still alive. */
+    private static boolean leftThreads(Set<Thread> before) {
+        for (Thread thread : Thread.getAllStackTraces().keySet()) {
+            if (!before.contains(thread) && thread.isAlive() && thread != Thread.currentThread()) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    /** Turn System.exit from user code into an exception while a program runs. */
+    @SuppressWarnings("removal")
+    private static void installExitTrap() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkExit(int status) {
+                    if (trapExit) {
+                        throw new ExitTrap(status);
+                    }
+                }
+
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkPermission(Permission perm, Object context) {
+                }
+            });
+        } catch (UnsupportedOperationException | SecurityException e) {
+            // JDK 18+: System.exit ends the worker; the pool reports the run as lost
+            REAL_ERR.println("Worker: System.exit cannot be trapped on this JVM");
+        }
+    }
+
+    private static String readString(DataInputStream in) throws IOException {
+        byte[] bytes = new byte[in.readInt()];
+        in.readFully(bytes);
+        return new String(bytes, StandardCharsets.UTF_8);
+    }
+
+    private static void writeBytes(DataOutputStream out, byte[] bytes) throws IOException {
+        out.writeInt(bytes.length);
+        out.write(bytes);
+    }
+
+    private static final class ExitTrap extends SecurityException {
+        final int status;
+
+        ExitTrap(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    /** Keeps the first `limit` bytes and silently drops the rest. */
+    private static final class CappedOutputStream extends ByteArrayOutputStream {
+        private final int limit;
+
+        CappedOutputStream(int limit) {
+            this.limit = limit;
+        }
+
+        @Override
+        public synchronized void write(int b) {
+            if (count < limit) {
+                super.write(b);
+            }
+        }
+
+        @Override
+        public synchronized void write(byte[] b, int off, int len) {
+            super.write(b, off, Math.max(0, Math.min(len, limit - count)));
+        }
+    }
+
+    private static final class SourceFile extends SimpleJavaFileObject {
+        private final String source;
+
+        SourceFile(String className, String source) {
+            super(URI.create("string:///" + className + Kind.SOURCE.extension), Kind.SOURCE);
+            this.source = source;
+        }
+
+        @Override
+        public CharSequence getCharContent(boolean ignoreEncodingErrors) {
+            return source;
+        }
+    }
+
+    private static final class ClassFile extends SimpleJavaFileObject {
+        private final String className;
+        private final Map<String, byte[]> classes;
+
+        ClassFile(String className, Map<String, byte[]> classes) {
+            super(URI.create("mem:///" + className.replace('.', '/') + Kind.CLASS.extension), Kind.CLASS);
+            this.className = className;
+            this.classes = classes;
+        }
+
+        @Override
+        public OutputStream openOutputStream() {
+            return new ByteArrayOutputStream() {
+                @Override
+                public void close() throws IOException {
+                    super.close();
+                    classes.put(className, toByteArray());
+                }
+            };
+        }
+    }
+
+    private static final class MemoryFileManager extends ForwardingJavaFileManager<JavaFileManager> {
+        private final Map<String, byte[]> classes;
+
+        MemoryFileManager(JavaFileManager fileManager, Map<String, byte[]> classes) {
+            super(fileManager);
+            this.classes = classes;
+        }
+
+        @Override
+        public JavaFileObject getJavaFileForOutput(Location location, String className,
+                                                   JavaFileObject.Kind kind, FileObject sibling) {
+            return new ClassFile(className, classes);
+        }
+    }
+
+    /** Throwaway loader; its parent skips the application class path so Worker stays hidden. */
+    private static final class MemoryClassLoader extends ClassLoader {
+        private final Map<String, byte[]> classes;
+
+        MemoryClassLoader(Map<String, byte[]> classes) {
+            super(ClassLoader.getSystemClassLoader().getParent());
+            this.classes = classes;
+        }
+
+        @Override
+        protected Class<?> findClass(String name) throws ClassNotFoundException {
+            byte[] bytes = classes.get(name);
+            if (bytes == null) {
+                throw new ClassNotFoundException(name);
+            }
+            return defineClass(name, bytes, 0, bytes.length);
+        }
+    }
+}
@@ -0,0 +1,288 @@
+import os
+import queue
+import select
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+
+from sandbox import cap_output, exit_reason, release
+
+
+WORKER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jvm', 'Worker.java')
+
+# Generous upper bound for in-process javac; the run itself uses the language timeout
+COMPILE_TIMEOUT = 30  # seconds
+# A worker's CPU rlimit over its whole life (it is replaced after max_runs anyway)
+WORKER_CPU_SECONDS = 3600
+
+
+class WorkerCrashed(Exception):
+    """The worker JVM died or broke the protocol mid-request."""
+
+
+class RunLost(WorkerCrashed):
+    """The worker JVM died while running a program, taking its output with it."""
+
+
+class JvmWorker:
+    """
+    One long-lived `java Worker` process, started inside the sandbox (CPU
+    and file size rlimits, own session, cgroup memory and process caps when
+    configured; no address-space limit, which the JVM cannot live with) in
+    a working directory of its own.
+    Speaks the length-prefixed protocol documented in jvm/Worker.java.
+    """
+
+    def __init__(self, sandbox, classpath: str, home: str, max_output_bytes: int):
+        self.runs = 0
+        # False once a program left threads running in this JVM
+        self.reusable = True
+        # When the current program started (monotonic clock)
+        self.started = None
+        self.home = home
+        os.makedirs(home, exist_ok=True)
+        self.process = sandbox.spawn(
+            # Serial GC: far fewer threads to count against pids.max
+            ['java', '-XX:+UseSerialGC', '-cp', classpath, 'Worker', str(max_output_bytes)],
+            home,
+            WORKER_CPU_SECONDS,
+            stdin=subprocess.PIPE,
+            limit_address_space=False
+        )
+        self.process.stderr.close()
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self):
+        release(self.process)
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def clear_home(self):
+        """Remove what the last program wrote, so the next one starts in an empty directory."""
+        for entry in os.scandir(self.home):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+
+    def cpu_time(self):
+        """CPU seconds the worker JVM has used so far, or None when unknown."""
+        try:
+            with open(f'/proc/{self.process.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def run(self, class_name: str, source: str, timeout: float) -> tuple:
+        """
+        Compile and run one submission.
+        Returns (compiled, diagnostics, exit_code, stdout, stderr, wall_time,
+        cpu_time); all but the first two are None when compilation failed.
+        The times cover the program only (cpu_time is the whole JVM's, JIT
+        and GC included). Raises RunLost when the worker died after the
+        program started.
+        """
+        self.runs += 1
+        try:
+            for text in (class_name, source):
+                data = text.encode('utf-8')
+                self.process.stdin.write(struct.pack('>i', len(data)) + data)
+            self.process.stdin.flush()
+        except OSError as e:
+            raise WorkerCrashed(str(e))
+
+        deadline = time.monotonic() + COMPILE_TIMEOUT
+        compile_status = self._read_int(deadline)
+        diagnostics = self._read_string(deadline)
+        if compile_status != 0:
+            return False, diagnostics, None, None, None, None, None
+
+        cpu_before = self.cpu_time()
+        self.started = time.monotonic()
+        deadline = self.started + timeout
+        try:
+            exit_code = self._read_int(deadline)
+            stdout = self._read_string(deadline)
+            stderr = self._read_string(deadline)
+            self.reusable = self._read_int(deadline) == 1
+        except WorkerCrashed as e:
+            raise RunLost(str(e))
+        wall_time = time.monotonic() - self.started
+        cpu_after = self.cpu_time()
+        cpu_time = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+        return True, diagnostics, exit_code, stdout, stderr, wall_time, cpu_time
+
+    def _read_exact(self, size: int, deadline: float) -> bytes:
+        fd = self.process.stdout.fileno()
+        chunks = []
+        while size > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.process.args, 0)
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise WorkerCrashed("worker exited with status %s" % self.process.poll())
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _read_int(self, deadline: float) -> int:
+        return struct.unpack('>i', self._read_exact(4, deadline))[0]
+
+    def _read_string(self, deadline: float) -> str:
+        return self._read_exact(self._read_int(deadline), deadline).decode('utf-8', errors='replace')
+
+
+class JvmPool:
+    """
+    Fixed-size pool of pre-started JVM workers.
+
+    Workers are replaced after `max_runs` submissions, after a timeout and
+    after a crash, so a misbehaving program never affects the next request.
+    Programs share the worker JVM, and its SecurityManager only traps
+    System.exit: isolation comes from the sandbox envelope around the worker.
+    """
+
+    def __init__(self, size: int, max_runs: int, max_output: int, sandbox):
+        self.size = size
+        self.sandbox = sandbox
+        self.max_runs = max_runs
+        self.max_output = max_output
+        self._idle = queue.Queue()
+        self._classpath = None
+        self._scratch_dir = tempfile.mkdtemp(prefix='jvm_pool_')
+        self._lock = threading.Lock()
+        self._closed = False
+        self.available = shutil.which('java') is not None and shutil.which('javac') is not None
+        if self.available and size > 0:
+            # Start the JVMs in the background so importing the app stays fast
+            threading.Thread(target=self._fill, daemon=True).start()
+
+    def _build_worker(self) -> str:
+        """Compile jvm/Worker.java once per pool; returns the class path."""
+        with self._lock:
+            if self._classpath is None:
+                classpath = os.path.join(self._scratch_dir, 'classes')
+                os.makedirs(classpath, exist_ok=True)
+                process = subprocess.run(
+                    ['javac', '-nowarn', '-d', classpath, WORKER_SOURCE],
+                    capture_output=True,
+                    text=True
+                )
+                if process.returncode != 0:
+                    self.available = False
+                    raise WorkerCrashed(f"Could not build JVM worker: {process.stderr}")
+                self._classpath = classpath
+            return self._classpath
+
+    def _spawn(self) -> JvmWorker:
+        home = tempfile.mkdtemp(prefix='worker_', dir=self._scratch_dir)
+        # The worker counts bytes: one past what `max_output` characters can take shows the cap was passed
+        return JvmWorker(self.sandbox, self._build_worker(), home, 4 * self.max_output + 1)
+
+    def _fill(self):
+        try:
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+        except (OSError, WorkerCrashed):
+            self.available = False
+
+    def _replace(self, worker: JvmWorker):
+        """Retire `worker` and start a fresh one in its place."""
+        worker.kill()
+
+        def respawn():
+            if self._closed:
+                return
+            try:
+                self._idle.put(self._spawn())
+            except (OSError, WorkerCrashed):
+                self.available = False
+
+        threading.Thread(target=respawn, daemon=True).start()
+
+    def close(self):
+        """Kill the idle workers; busy ones are retired when their run ends."""
+        self._closed = True
+        self.available = False
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+    def run(self, class_name: str, source: str, timeout: float) -> tuple:
+        """
+        Compile and run a Java submission on an idle worker.
+        Returns (compiled, diagnostics, exit_code, stdout, stderr, resources)
+        with resources shaped like sandbox.Sandbox.run's (None when
+        compilation failed; no peak memory, which the JVM shares). A worker
+        that dies mid-run is a failed run: its output is lost, so stderr says
+        what happened instead.
+        Raises subprocess.TimeoutExpired when the program exceeds `timeout`
+        and WorkerCrashed when the program never started (no worker was idle,
+        or it died before compiling); the caller can then use javac.
+        """
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            raise WorkerCrashed("No idle JVM worker")
+        if not worker.alive():
+            self._replace(worker)
+            raise WorkerCrashed("JVM worker exited while idle")
+        try:
+            result = worker.run(class_name, source, timeout)
+        except subprocess.TimeoutExpired:
+            self._replace(worker)
+            raise subprocess.TimeoutExpired(['java', class_name], timeout)
+        except RunLost:
+            # Out of memory, a signal, or System.exit on a JVM that cannot trap it
+            resources = _resources(time.monotonic() - worker.started, None, exit_reason(worker.process))
+            returncode = worker.process.returncode
+            self._replace(worker)
+            if resources['terminated_by'] == 'memory_limit':
+                error = "Memory limit exceeded; process killed"
+            else:
+                error = f"JVM worker died during the run (exit status {returncode}); program output lost"
+            return True, "", returncode, "", error, resources
+        except WorkerCrashed:
+            self._replace(worker)
+            raise
+
+        if self._closed:
+            worker.kill()
+        elif worker.alive() and worker.reusable and worker.runs < self.max_runs:
+            worker.clear_home()
+            self._idle.put(worker)
+        else:
+            self._replace(worker)
+
+        compiled, diagnostics, exit_code, stdout, stderr, wall_time, cpu_time = result
+        if not compiled:
+            return compiled, diagnostics, exit_code, stdout, stderr, None
+        stdout, stderr, over_limit = cap_output(stdout, stderr, self.max_output)
+        if not over_limit:
+            return compiled, diagnostics, exit_code, stdout, stderr, _resources(wall_time, cpu_time, 'exit')
+        if not stderr:
+            stderr = f"Output limit of {self.max_output} characters reached; output truncated"
+        return compiled, diagnostics, exit_code, stdout, stderr, _resources(wall_time, cpu_time, 'output_limit')
+
+
+def _resources(wall_time: float, cpu_time, terminated_by: str) -> dict:
+    return {
+        "cpu_time": None if cpu_time is None else round(cpu_time, 4),
+        "wall_time": round(wall_time, 4),
+        "peak_memory_kb": None,
+        "terminated_by": terminated_by,
+    }
@@ -1,10 +1,103 @@
-import sys
-from openai import OpenAI
+import os
 import json
+import logging
+from llm_cache import LLMCache
+from llm_client import LLMClient, LLMError, OpenAIBackend, FakeBackend
+from json_stream import FieldStreamParser
+from image_prep import preprocess
+from metrics import registry, span
 
-client = OpenAI()
+logger = logging.getLogger(__name__)
+
+# LLM_BACKEND=fake answers locally so the API can be load-tested offline
+if os.environ.get('LLM_BACKEND', 'openai') == 'fake':
+    backend = FakeBackend(latency=float(os.environ.get('LLM_FAKE_LATENCY', 1.0)))
+else:
+    backend = OpenAIBackend(
+        max_connections=int(os.environ.get('LLM_MAX_CONCURRENCY', 16)),
+        timeout=float(os.environ.get('LLM_DEADLINE', 60))
+    )
+
+client = LLMClient(
+    backend,
+    max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', 16)),
+    queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT', 2)),
+    deadline=float(os.environ.get('LLM_DEADLINE', 60)),
+    max_attempts=int(os.environ.get('LLM_MAX_ATTEMPTS', 3))
+)
+
+# Identical prompts (same model, instructions, code or image) reuse earlier answers
+llm_cache = LLMCache(
+    max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 1000)),
+    ttl=float(os.environ.get('LLM_CACHE_TTL', 24 * 60 * 60)),
+    directory=os.environ.get('LLM_CACHE_DIR') or None
+)
+
+# Uploaded photos are shrunk and cleaned up before the vision call
+IMAGE_PREPROCESS = os.environ.get('IMAGE_PREPROCESS', '1') == '1'
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 1600))
+IMAGE_JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 80))
+
+def cached_completion(parse, cache_key=None, **request):
+    """
+    Run a chat completion through the response cache.
+    `parse` turns the message content into the value that gets cached; if it
+    raises, the error reaches the caller and nothing is stored. `cache_key`
+    overrides the key derived from the request.
+    """
+    model = request.get('model')
+
+    def compute():
+        try:
+            with span('llm_upstream'):
+                content, tokens = client.complete(**request)
+        except LLMError:
+            registry.inc('llm_calls_total', model=model, outcome='error')
+            raise
+        registry.inc('llm_calls_total', model=model, outcome='ok')
+        registry.inc('llm_tokens_total', tokens or 0, model=model)
+        logger.debug("LLM response", extra={'model': model, 'tokens': tokens, 'length': len(content or '')})
+        with span('llm_parse'):
+            return parse(content), tokens
+
+    return llm_cache.get_or_compute(cache_key or LLMCache.make_key(**request), compute)
+
+def parse_transcription(content):
+    """Extract (code, language, concept, summary, analysis) from a transcription reply."""
+    data = json.loads(content)
+
+    # Extract required fields with default values if keys are missing
+    language = data.get("language", "Unknown")
+    code = data.get("code", "")
+    concept = data.get("concept", "")
+    summary = data.get("summary", "")
+    analysis = data.get("analysis", "")
+
+    # Optionally, you can perform additional validation here
+    if not language or not code:
+        raise ValueError("Essential fields are missing in the response.")
+
+    return code, language, concept, summary, analysis
+
+def parse_tests(content):
+    """Extract (code, reason, status) from a test generation reply."""
+    parsed_data = json.loads(content)
+    return parsed_data['code'], parsed_data['reason'], parsed_data['status']
+
+def transcription_request(img_url=None, img_base64=None):
+    """
+    Build the chat completion request that transcribes an image into code.
+    Returns (request, cache_key); uploaded images are keyed by an exact
+    digest of the preprocessed pixels, so the same photo uploaded again
+    reuses the earlier answer.
+    """
+    image_digest = None
+    if img_base64 and IMAGE_PREPROCESS:
+        try:
+            img_base64, image_digest = preprocess(img_base64, IMAGE_MAX_DIMENSION, IMAGE_JPEG_QUALITY)
+        except ValueError as e:
+            logger.warning("Image preprocessing skipped: %s", e)
 
-def request_code(img_url=None, img_base64=None):
     # instructions = "Please transcribe the content of this image into code. Return only the name of the coding language used (either c, bash, java, or python), bolded in markdown, one markdown code box with the extracted code, and a short (3-8 word) sentence describing the programming concept of the program (ex. 'Socket Programming in C'). The markdown code box should be language ambiguious, denoted using only triple backticks. Fix any errors that are likely to be ambigious to a grader."
     if img_url:
         img_request = {"type": "image_url", "image_url": {"url": img_url}}
@@ -43,43 +136,85 @@ def request_code(img_url=None, img_base64=None):
             "content": [img_request]
         }
     ]
-    print(messages)
 
-    response = client.chat.completions.create(
+    request = dict(
         model="gpt-4o-mini",
         messages=messages,
         max_tokens=1000,
         temperature=1,
     )
+    if image_digest:
+        cache_key = LLMCache.make_key(**dict(request, messages=[messages[0], {'image_digest': image_digest}]))
+    else:
+        cache_key = LLMCache.make_key(**request)
+    return request, cache_key
+
+def request_code(img_url=None, img_base64=None):
+    try:
+        request, cache_key = transcription_request(img_url, img_base64)
+        return cached_completion(parse_transcription, cache_key=cache_key, **request)
+    except json.JSONDecodeError as e:
+        logger.warning("Error decoding JSON content: %s", e)
+    except ValueError as e:
+        logger.warning("Error parsing JSON content: %s", e)
+
+def stream_code(img_url=None, img_base64=None):
+    """
+    Transcribe an image while the reply streams in. Yields (event, data):
+      ('language', str)  as soon as the language field is complete
+      ('code', str)      successive pieces of the code field
+      ('result', dict)   the validated final result, always last on success
+    Raises LLMError if the model fails or the reply does not validate.
+    """
+    request, key = transcription_request(img_url, img_base64)
+    result = llm_cache.lookup(key)
 
-    if response.choices:
-        content = response.choices[0].message.content
-        print(content)
-        # Parse the JSON content
+    if result is None:
+        parser = FieldStreamParser()
+        content = []
+        language = []
+        tokens = 0
+        model = request.get('model')
+        try:
+            # Includes the time the client takes to read each piece
+            with span('llm_upstream'):
+                for event, data in client.stream(**request):
+                    if event == 'usage':
+                        tokens = data
+                        continue
+                    content.append(data)
+                    for field, fragment, complete in parser.feed(data):
+                        if field == 'language':
+                            language.append(fragment)
+                            if complete:
+                                yield 'language', ''.join(language)
+                        elif field == 'code' and fragment:
+                            yield 'code', fragment
+        except LLMError:
+            registry.inc('llm_calls_total', model=model, outcome='error')
+            raise
+        registry.inc('llm_calls_total', model=model, outcome='ok')
+        registry.inc('llm_tokens_total', tokens or 0, model=model)
+        content = ''.join(content)
+        logger.debug("LLM response", extra={'model': model, 'tokens': tokens, 'length': len(content)})
         try:
-            data = json.loads(content)
-
-            # Extract required fields with default values if keys are missing
-            language = data.get("language", "Unknown")
-            code = data.get("code", "")
-            concept = data.get("concept", "")
-            summary = data.get("summary", "")
-            analysis = data.get("analysis", "")
-
-            # Optionally, you can perform additional validation here
-            if not language or not code:
-                raise ValueError("Essential fields are missing in the response.")
-
-            # Return the extracted values
-            return code, language, concept, summary, analysis
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON content: {e}")
+            with span('llm_parse'):
+                result = parse_transcription(content)
         except ValueError as e:
-            print(f"Error parsing JSON content: {e}")
-
+            raise LLMError(f"Could not parse model response: {e}") from e
+        llm_cache.store(key, result, tokens)
     else:
-        print("Error: No response received from the model.")
-        sys.exit(1)
+        yield 'language', result[1]
+        yield 'code', result[0]
+
+    code, language, concept, summary, analysis = result
+    yield 'result', {
+        'code': code,
+        'language': language,
+        'concept': concept,
+        'summary': summary,
+        'analysis': analysis,
+    }
 
 def generate_tests(code, language, context=None):
     # TODO: Include expected output in the test cases
@@ -124,24 +259,14 @@ def generate_tests(code, language, context=None):
             ]
         }
     ]
-    print(messages)
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        max_tokens=1000,
-    )
-
-    if response.choices:
-        print(response.choices[0].message.content)
-
-        parsed_data = json.loads(response.choices[0].message.content)
 
-        output_code = parsed_data['code']
-        reason = parsed_data['reason']
-        status = parsed_data['status']
-
-        return output_code, language, reason, status
-    else:
-        print("Error: No response received from the model.")
-        sys.exit(1)
\ No newline at end of file
+    try:
+        output_code, reason, status = cached_completion(
+            parse_tests,
+            model="gpt-4o-mini",
+            messages=messages,
+            max_tokens=1000,
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        raise LLMError(f"Could not parse model response: {e}") from e
+    return output_code, language, reason, status
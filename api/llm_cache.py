@@ -0,0 +1,178 @@
+import collections
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+
+
+class _Flight:
+    """An upstream call in progress that identical requests can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.tokens = 0
+        self.error = None
+
+
+class LLMCache:
+    """
+    LRU + TTL cache for parsed LLM responses, with request coalescing.
+
+    Values are kept in memory and, when `directory` is set, also as one JSON
+    file per key so they survive restarts. Concurrent calls for the same key
+    share a single upstream request.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, directory: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = collections.OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(**request) -> str:
+        """Hash a completion request; text is compared modulo trailing whitespace."""
+        canonical = json.dumps(_normalize(request), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, key: str, compute):
+        """
+        Return the cached value for `key`, or call `compute()` once for all
+        concurrent callers. `compute` returns (value, tokens_used); if it
+        raises, nothing is cached and every waiting caller sees the error.
+        """
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None:
+                self._stats['hits'] += 1
+                self._stats['saved_tokens'] += entry['tokens']
+                return entry['value']
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                self._stats['saved_tokens'] += flight.tokens
+            return flight.value
+
+        try:
+            flight.value, flight.tokens = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            self._put(key, flight.value, flight.tokens)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def lookup(self, key: str):
+        """Return the cached value for `key`, or None (counted as a miss)."""
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            self._stats['saved_tokens'] += entry['tokens']
+            return entry['value']
+
+    def store(self, key: str, value, tokens: int):
+        """Cache a value computed outside get_or_compute (e.g. a streamed reply)."""
+        self._put(key, value, tokens)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self._stats['hits'],
+                'misses': self._stats['misses'],
+                'coalesced': self._stats['coalesced'],
+                'saved_tokens': self._stats['saved_tokens'],
+            }
+
+    def _get(self, key: str):
+        """Look `key` up in memory, then on disk. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None and self.directory:
+            entry = self._read_file(key)
+            if entry is not None:
+                self._entries[key] = entry
+        if entry is None:
+            return None
+        if time.time() - entry['created'] > self.ttl:
+            del self._entries[key]
+            self._remove_file(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: str, value, tokens: int):
+        entry = {'value': value, 'tokens': tokens, 'created': time.time()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._remove_file(evicted)
+        if self.directory:
+            self._write_file(key, entry)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _read_file(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+            entry['value'] = tuple(entry['value'])
+            return entry
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_file(self, key: str, entry: dict):
+        tmp_path = os.path.join(self.directory, f'.tmp-{secrets.token_hex(8)}')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except (OSError, TypeError, ValueError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def _remove_file(self, key: str):
+        if self.directory:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return '\n'.join(line.rstrip() for line in value.strip().split('\n'))
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import queue
+import random
+import threading
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+
+class LLMError(Exception):
+    """The model call failed; the request should get an error response."""
+
+
+class LLMUnavailable(LLMError):
+    """Too busy or past the deadline; fail fast instead of holding a worker."""
+
+
+# Errors worth another attempt; everything else fails immediately
+RETRYABLE = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class OpenAIBackend:
+    """Chat completions over one pooled async HTTP client."""
+
+    def __init__(self, max_connections: int, timeout: float):
+        self.client = AsyncOpenAI(
+            max_retries=0,  # LLMClient retries with its own jittered backoff
+            timeout=timeout,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                ),
+                timeout=timeout
+            )
+        )
+
+    async def complete(self, **request) -> tuple:
+        """Returns (content, total_tokens)."""
+        response = await self.client.chat.completions.create(**request)
+        if not response.choices:
+            raise LLMError("No response received from the model.")
+        tokens = response.usage.total_tokens if response.usage else 0
+        return response.choices[0].message.content, tokens
+
+    async def stream(self, **request):
+        """Yield ('delta', text) as the reply arrives, then ('usage', total_tokens)."""
+        response = await self.client.chat.completions.create(
+            **request, stream=True, stream_options={"include_usage": True}
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield 'delta', chunk.choices[0].delta.content
+            if chunk.usage:
+                yield 'usage', chunk.usage.total_tokens
+
+
+class FakeBackend:
+    """
+    Offline stand-in for load tests: sleeps for `latency` seconds and answers
+    with a well-formed reply for whichever prompt it was given.
+    """
+
+    TRANSCRIPTION = {
+        "language": "python",
+        "code": "def add(a, b):\n    return a + b\n\nprint(add(2, 3))",
+        "concept": "Functions",
+        "summary": "Add two numbers",
+        "analysis": "",
+    }
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def complete(self, **request) -> tuple:
+        await asyncio.sleep(self.latency)
+        return self._reply(request), 0
+
+    async def stream(self, **request):
+        reply = self._reply(request)
+        chunks = [reply[i:i + 8] for i in range(0, len(reply), 8)]
+        for chunk in chunks:
+            await asyncio.sleep(self.latency / len(chunks))
+            yield 'delta', chunk
+        yield 'usage', 0
+
+    def _reply(self, request: dict) -> str:
+        system_prompt = request['messages'][0]['content']
+        if 'test cases' in system_prompt:
+            code = request['messages'][1]['content'][0]['text']
+            reply = {"code": code, "reason": "", "status": 1}
+        else:
+            reply = self.TRANSCRIPTION
+        return json.dumps(reply)
+
+
+class LLMClient:
+    """
+    Synchronous facade over an async backend, for use from Flask handlers.
+
+    Calls run on one background event loop. At most `max_concurrency` are
+    in flight; a call that cannot start within `queue_timeout` seconds, or
+    that does not finish (retries included) within `deadline` seconds,
+    raises LLMUnavailable.
+    """
+
+    def __init__(self, backend, max_concurrency: int, queue_timeout: float,
+                 deadline: float, max_attempts: int):
+        self.backend = backend
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self._max_concurrency = max_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        threading.Thread(target=self._run_loop, name='llm-loop', daemon=True).start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._ready.set()
+        self._loop.run_forever()
+
+    def complete(self, **request) -> tuple:
+        """Run one chat completion; returns (content, total_tokens)."""
+        future = asyncio.run_coroutine_threadsafe(self._complete(request), self._loop)
+        return future.result()
+
+    def stream(self, **request):
+        """
+        Run one streamed chat completion, yielding ('delta', text) pieces and
+        finally ('usage', total_tokens). Closing the generator cancels the call.
+        """
+        events = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._guarded(self._stream_with_retries(request, events)), self._loop
+        )
+        future.add_done_callback(lambda _: events.put(None))
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                yield event
+            future.result()
+        finally:
+            future.cancel()
+
+    async def _complete(self, request: dict) -> tuple:
+        return await self._guarded(self._with_retries(request))
+
+    async def _guarded(self, work):
+        """Apply the concurrency limit and the overall deadline to `work`."""
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            work.close()
+            raise LLMUnavailable("Too many LLM requests in flight, try again shortly.")
+        try:
+            return await asyncio.wait_for(work, self.deadline)
+        except asyncio.TimeoutError:
+            raise LLMUnavailable(f"LLM request exceeded its {self.deadline:g}s deadline.")
+        finally:
+            self._semaphore.release()
+
+    async def _stream_with_retries(self, request: dict, events: queue.Queue):
+        """Retry a stream only while nothing has been forwarded yet."""
+        for attempt in range(self.max_attempts):
+            forwarded = False
+            try:
+                async for event in self.backend.stream(**request):
+                    forwarded = True
+                    events.put(event)
+                return
+            except RETRYABLE as e:
+                if forwarded or attempt + 1 == self.max_attempts:
+                    raise LLMUnavailable(f"LLM request failed: {e}")
+                await asyncio.sleep(random.uniform(0, min(8.0, 0.5 * 2 ** attempt)))
+            except openai.OpenAIError as e:
+                raise LLMError(f"LLM request failed: {e}")
+
+    async def _with_retries(self, request: dict) -> tuple:
+        for attempt in range(self.max_attempts):
+            try:
+                return await self.backend.complete(**request)
+            except RETRYABLE as e:
+                if attempt + 1 == self.max_attempts:
+                    raise LLMUnavailable(f"LLM request failed: {e}")
+                # Full jitter: spread retries so a burst of failures doesn't re-synchronize
+                await asyncio.sleep(random.uniform(0, min(8.0, 0.5 * 2 ** attempt)))
+            except openai.OpenAIError as e:
+                raise LLMError(f"LLM request failed: {e}")
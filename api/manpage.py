@@ -0,0 +1,89 @@
+import re
+
+# A character followed by a backspace: overstrike (X\bX, bold) or underline (_\bX)
+OVERSTRIKE = re.compile(r'.\x08', re.S)
+SECTION = re.compile('NAME|SYNOPSIS|DESCRIPTION|EXIT STATUS|SEE ALSO|STANDARDS')
+
+
+def format_manual_page(raw_text):
+    """
+    Format a raw manual page text by:
+    1. Removing backslash-b sequences (\b) and their preceding characters
+    2. Properly indenting sections
+    3. Maintaining line breaks
+    4. Cleaning up unnecessary spaces
+    """
+    cleaned_text = OVERSTRIKE.sub('', raw_text)
+    return '\n'.join([_format_line(line) for line in cleaned_text.split('\n')])
+
+
+def _format_line(line):
+    """Format one line of an already de-overstruck manual page."""
+    stripped = line.strip()
+    # Skip empty lines
+    if not stripped:
+        return ''
+
+    # Detect section headers
+    if SECTION.search(line.upper()):
+        return '\n' + stripped
+
+    # Preserve indentation for option descriptions
+    if line.startswith(' '):
+        return ' ' * (len(line) - len(line.lstrip())) + stripped
+    return stripped
+
+
+class ManPageFormatter:
+    """
+    Streaming format_manual_page: feed() raw chunks, then call finish().
+
+    Concatenating everything returned equals format_manual_page() of the
+    concatenated input, truncated to `max_length` characters. Once the limit
+    is reached `done` is set and further input is ignored, so callers can
+    stop reading (or kill the producer) early.
+    """
+
+    def __init__(self, max_length: int = None):
+        self.max_length = max_length
+        self.emitted = 0
+        self.done = False
+        self._raw_tail = ''   # last raw char: the next chunk may start with \b
+        self._line = []       # cleaned text of the current, unfinished line
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ''
+        buffer = self._raw_tail + chunk
+        pieces = []
+        last_end = 0
+        for match in OVERSTRIKE.finditer(buffer):
+            pieces.append(buffer[last_end:match.start()])
+            last_end = match.end()
+        tail = buffer[last_end:]
+        pieces.append(tail[:-1])
+        self._raw_tail = tail[-1:]
+
+        lines = ''.join(pieces).split('\n')
+        if len(lines) == 1:
+            self._line.append(lines[0])
+            return ''
+        lines[0] = ''.join(self._line) + lines[0]
+        self._line = [lines.pop()]
+        return self._emit(''.join([_format_line(line) + '\n' for line in lines]))
+
+    def finish(self) -> str:
+        """Flush the final line (which has no trailing newline)."""
+        if self.done:
+            return ''
+        lines = (''.join(self._line) + self._raw_tail).split('\n')
+        self._line = []
+        self._raw_tail = ''
+        return self._emit('\n'.join([_format_line(line) for line in lines]))
+
+    def _emit(self, text: str) -> str:
+        if self.max_length is not None and self.emitted + len(text) >= self.max_length:
+            text = text[:self.max_length - self.emitted]
+            self.done = True
+        self.emitted += len(text)
+        return text
@@ -0,0 +1,228 @@
+import bisect
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+# Buckets (seconds) for every histogram; covers a fork (~1ms) up to a timed-out run
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# A snapshot not rewritten for this long belongs to a process that has exited
+STALE_AFTER = 60  # seconds
+
+# Phase durations of the request being handled on this thread, if it asked for them
+_timings = contextvars.ContextVar('timings', default=None)
+
+
+class Registry:
+    """
+    Counters, histograms and gauges, rendered in the Prometheus text format.
+
+    Updates are a dictionary operation under one lock, cheap enough to leave
+    on. Each server process has its own registry; with a shared `directory`
+    every process periodically writes a snapshot there and render() adds up
+    the snapshots of all processes, so a scrape reaching any gunicorn worker
+    sees the totals.
+    """
+
+    def __init__(self, directory: str = None, interval: float = 5.0):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = {}     # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._collected = {}    # name -> callable returning a number or {labels: number}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._snapshot_path = os.path.join(directory, f'{os.getpid()}-{secrets.token_hex(4)}.json')
+            threading.Thread(target=self._write_snapshots, args=(interval,), name='metrics-snapshot',
+                             daemon=True).start()
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._types[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        index = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self, name: str, kind: str, help_text: str, read):
+        """
+        Register `read()`, called at scrape time, for values another component
+        already keeps (queue depth, cache hits). It returns a number or
+        {((label, value), ...): number}.
+        """
+        self.describe(name, kind, help_text)
+        self._collected[name] = read
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(series)] for (name, labels), series in self._histograms.items()]
+        collected = []
+        for name, read in self._collected.items():
+            try:
+                value = read()
+            except Exception:
+                continue
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            collected.extend([name, [list(pair) for pair in labels], number] for labels, number in items)
+        return {'counters': counters, 'histograms': histograms, 'collected': collected}
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            snapshots.extend(self._other_snapshots())
+
+        counters, histograms, collected = {}, {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, _as_key(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, series in snapshot['histograms']:
+                key = (name, _as_key(labels))
+                total = histograms.setdefault(key, [0] * len(series))
+                for index, value in enumerate(series):
+                    total[index] += value
+            for name, labels, value in snapshot['collected']:
+                key = (name, _as_key(labels))
+                collected[key] = collected.get(key, 0) + value
+
+        lines = []
+        written = set()
+
+        def header(name):
+            if name not in written:
+                written.add(name)
+                lines.append(f'# HELP {name} {self._help.get(name, name)}')
+                lines.append(f'# TYPE {name} {self._types.get(name, "untyped")}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name)
+            lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+        for (name, labels), value in sorted(collected.items()):
+            header(name)
+            lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+        for (name, labels), series in sorted(histograms.items()):
+            header(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(bound)
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_number(series[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Write this process's snapshot now (done every few seconds anyway)."""
+        if not self.directory:
+            return
+        tmp = self._snapshot_path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, self._snapshot_path)
+        except OSError:
+            pass
+
+    def _write_snapshots(self, interval: float):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def _other_snapshots(self) -> list:
+        snapshots = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return snapshots
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.json') or path == self._snapshot_path:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Gauges describe live state; a process that stopped writing no longer has any
+            if time.time() - os.path.getmtime(path) > STALE_AFTER:
+                snapshot['collected'] = [
+                    series for series in snapshot['collected'] if self._types.get(series[0]) != 'gauge'
+                ]
+            snapshots.append(snapshot)
+        return snapshots
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _as_key(labels: list) -> tuple:
+    return tuple(tuple(pair) for pair in labels)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = Registry(os.environ.get('METRICS_DIR') or None)
+registry.describe('phase_seconds', 'histogram', 'Time spent in each phase of handling a request.')
+registry.describe('runs_total', 'counter', 'Submissions run, by language and outcome.')
+registry.describe('http_requests_total', 'counter', 'HTTP requests, by endpoint and status code.')
+registry.describe('http_request_seconds', 'histogram', 'HTTP request latency, by endpoint.')
+registry.describe('llm_calls_total', 'counter', 'LLM calls, by model and outcome.')
+registry.describe('llm_tokens_total', 'counter', 'Tokens used by LLM calls, by model.')
+
+
+@contextmanager
+def span(phase: str):
+    """Time a phase: recorded in phase_seconds and in the current request's timings."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe('phase_seconds', elapsed, phase=phase)
+        timings = _timings.get()
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + elapsed
+
+
+def collect_timings():
+    """Start collecting span durations for the request on this thread; returns a reset token."""
+    return _timings.set({})
+
+
+def stop_timings(token) -> dict:
+    """Stop collecting; returns {phase: milliseconds}."""
+    timings = _timings.get() or {}
+    _timings.reset(token)
+    return {phase: round(seconds * 1000, 3) for phase, seconds in timings.items()}
@@ -0,0 +1,156 @@
+import fcntl
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Serializes installs into a site_dir across processes (see PackageMirror._install)
+LOCK_NAME = '.install.lock'
+
+class PackageMirror:
+    """
+    Third-party packages for Python submissions, served from a local wheelhouse.
+
+    `wheelhouse` holds pre-downloaded wheels (see `python packages.py
+    download`). They are installed without network access into `site_dir`,
+    which submissions get on their path; the server's own interpreter is
+    never modified. Installs run on one background thread, so a request only
+    does a dictionary lookup, and one at a time across all server processes
+    sharing `site_dir`.
+    """
+
+    def __init__(self, wheelhouse: str, site_dir: str):
+        self.wheelhouse = wheelhouse
+        self.site_dir = site_dir
+        os.makedirs(site_dir, exist_ok=True)
+        self.index = self._build_index()
+        self._pending = set()
+        # Wheels pip could not install; not retried until the server restarts
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._install_worker, name='package-installer', daemon=True).start()
+
+    def _build_index(self) -> dict:
+        """Map importable top-level module names to wheel files."""
+        index = {}
+        if not os.path.isdir(self.wheelhouse):
+            return index
+        for name in sorted(os.listdir(self.wheelhouse)):
+            if name.endswith('.whl'):
+                for module in _top_level_modules(os.path.join(self.wheelhouse, name)):
+                    index.setdefault(module, os.path.join(self.wheelhouse, name))
+        return index
+
+    def is_installed(self, module: str) -> bool:
+        return any(
+            os.path.exists(os.path.join(self.site_dir, candidate))
+            for candidate in (module, f'{module}.py')
+        ) or any(
+            entry.startswith(f'{module}.') and entry.endswith(('.so', '.pyd'))
+            for entry in os.listdir(self.site_dir)
+        )
+
+    def resolve(self, module: str) -> str:
+        """
+        Returns 'installed', 'installing' (an install was queued or is
+        running) or 'unavailable' (not in the wheelhouse, or its install
+        failed).
+        """
+        module = module.split('.')[0]
+        if self.is_installed(module):
+            return 'installed'
+        wheel = self.index.get(module)
+        if wheel is None:
+            return 'unavailable'
+        with self._lock:
+            if wheel in self._failed:
+                return 'unavailable'
+            if wheel not in self._pending:
+                self._pending.add(wheel)
+                self._queue.put(wheel)
+        return 'installing'
+
+    def install_all(self):
+        """Queue every wheel that is not installed yet (run at startup)."""
+        for module in self.index:
+            self.resolve(module)
+
+    def _install_worker(self):
+        while True:
+            wheel = self._queue.get()
+            installed = False
+            try:
+                installed = self._install(wheel)
+            finally:
+                with self._lock:
+                    if not installed:
+                        self._failed.add(wheel)
+                    self._pending.discard(wheel)
+
+    def _install(self, wheel: str) -> bool:
+        """
+        Install `wheel` into site_dir unless another server process already
+        has. Every gunicorn worker has a mirror of its own on the same
+        site_dir, so installs take an exclusive lock on it: one pip at a
+        time, and the others find the packages in place.
+        """
+        try:
+            with open(os.path.join(self.site_dir, LOCK_NAME), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file closes
+                if all(self.is_installed(module) for module, source in self.index.items() if source == wheel):
+                    return True
+                # --no-index: dependencies must come from the wheelhouse too
+                process = subprocess.run(
+                    [sys.executable, '-m', 'pip', 'install', '--quiet', '--no-index',
+                     '--find-links', self.wheelhouse, '--target', self.site_dir, wheel],
+                    capture_output=True,
+                    text=True,
+                    timeout=600
+                )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.error("Error installing %s: %s", wheel, e)
+            return False
+        if process.returncode != 0:
+            logger.error(
+                "pip could not install %s (exit status %s): %s", wheel, process.returncode, process.stderr.strip()
+            )
+            return False
+        return True
+
+def _top_level_modules(wheel_path: str) -> set:
+    """Read the importable names a wheel provides from its metadata."""
+    modules = set()
+    try:
+        with zipfile.ZipFile(wheel_path) as wheel:
+            names = wheel.namelist()
+            top_level = [name for name in names if name.endswith('.dist-info/top_level.txt')]
+            if top_level:
+                text = wheel.read(top_level[0]).decode('utf-8')
+                modules.update(line.strip() for line in text.splitlines() if line.strip())
+            else:
+                # No top_level.txt (e.g. flit/hatch wheels): use the archive layout
+                for name in names:
+                    first = name.split('/')[0]
+                    if first.endswith(('.dist-info', '.data')):
+                        continue
+                    modules.add(first[:-3] if first.endswith('.py') else first.split('.')[0])
+    except (OSError, zipfile.BadZipFile, KeyError):
+        pass
+    return {module for module in modules if module and not module.startswith('_')}
+
+
+if __name__ == '__main__':
+    # Ahead of time, with network access:
+    #   python packages.py download <wheelhouse> numpy pandas ...
+    #   python packages.py download <wheelhouse> -r sandbox-requirements.txt
+    if len(sys.argv) < 4 or sys.argv[1] != 'download':
+        sys.exit("usage: python packages.py download <wheelhouse> <pip requirement args...>")
+    sys.exit(subprocess.call(
+        [sys.executable, '-m', 'pip', 'download', '--only-binary=:all:', '-d', sys.argv[2]] + sys.argv[3:]
+    ))
@@ -0,0 +1,300 @@
+import importlib
+import json
+import linecache
+import os
+import resource
+import secrets
+import select
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from sandbox import kill_cgroup, read_output_files, remove_cgroup
+
+
+# Files written by a child (including captured stdout/stderr) are capped here;
+# output past `max_output` characters ends the run as an output_limit
+MAX_FILE_BYTES = 1024 * 1024
+
+
+class ZygoteUnavailable(Exception):
+    """The zygote is not running and could not be (re)started."""
+
+
+class PythonPool:
+    """
+    Client side of the Python zygote.
+
+    The zygote is a separate interpreter that imports `preload` once and then
+    forks one child per submission, so a run only pays for fork() plus the
+    user's own code. Each child executes in a fresh `__main__` namespace
+    under rlimits, in its own session and, when `sandbox` has cgroups, in
+    a per-run cgroup (memory and process caps); whatever it leaves running
+    is killed with it.
+    """
+
+    def __init__(self, preload: list, memory_bytes: int, max_output: int, env: dict = None, sandbox=None):
+        self.preload = preload
+        self.env = env
+        self.sandbox = sandbox
+        self.memory_bytes = memory_bytes
+        self.max_output = max_output
+        self.socket_path = os.path.join(tempfile.gettempdir(), f'python_zygote_{secrets.token_hex(8)}.sock')
+        self._process = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the zygote if it is not already running."""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+            self._process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), self.socket_path,
+                 ','.join(self.preload), str(self.memory_bytes)],
+                stdin=subprocess.DEVNULL,
+                env=self.env
+            )
+
+    def stop(self):
+        """Terminate the zygote; children already running finish on their own."""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+                self._process.wait()
+            self._process = None
+
+    def _connect(self, timeout: float) -> socket.socket:
+        self.start()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(timeout)
+        try:
+            conn.connect(self.socket_path)
+        except OSError:
+            # Still importing the preload set, or it died: let the caller fall back
+            conn.close()
+            raise ZygoteUnavailable("Python zygote is not accepting connections")
+        return conn
+
+    def run(self, source: str, file_path: str, run_dir: str, timeout: float) -> tuple:
+        """
+        Run `source` in a forked child with `run_dir` as working directory;
+        `file_path` is the script's name (argv[0], __file__, tracebacks) and
+        need not exist.
+        Returns (returncode, stdout, stderr, resources) with resources shaped
+        like sandbox.Sandbox.run's; raises subprocess.TimeoutExpired.
+        """
+        start = time.monotonic()
+        conn = self._connect(timeout)
+        cgroup = self.sandbox.create_cgroup() if self.sandbox is not None else None
+        pid = None
+        try:
+            conn.sendall(json.dumps({
+                'source': source,
+                'file_path': file_path,
+                'run_dir': run_dir,
+                'timeout': timeout,
+                'cgroup': cgroup,
+            }).encode('utf-8') + b'\n')
+            reader = conn.makefile('r')
+            pid = int(reader.readline())
+            line = reader.readline()
+        except socket.timeout:
+            if pid is None:
+                raise ZygoteUnavailable("Python zygote did not answer")
+            # The child leads its own session: this takes its background processes too
+            _kill_group(pid)
+            raise subprocess.TimeoutExpired([file_path], timeout)
+        except (OSError, ValueError):
+            raise ZygoteUnavailable("Python zygote did not answer")
+        finally:
+            conn.close()
+            if cgroup is not None:
+                kill_cgroup(cgroup)
+                remove_cgroup(cgroup)
+
+        resources = {
+            "cpu_time": None,
+            "wall_time": round(time.monotonic() - start, 4),
+            "peak_memory_kb": None,
+            "terminated_by": "exit",
+        }
+        # An empty line means the child died without reporting (signal, rlimit)
+        if line.strip():
+            returncode, cpu_time, peak_memory_kb = line.split()
+            returncode = int(returncode)
+            resources["cpu_time"] = round(float(cpu_time), 4)
+            resources["peak_memory_kb"] = int(peak_memory_kb)
+        else:
+            # Killed before it could clean up after itself
+            _kill_group(pid)
+            returncode = 1
+            resources["terminated_by"] = "signal"
+        stdout, stderr, over_limit = read_output_files(run_dir, self.max_output)
+        if over_limit:
+            # Whatever happened next (EFBIG once past MAX_FILE_BYTES) followed from it
+            resources["terminated_by"] = "output_limit"
+            if not stderr:
+                stderr = f"Output limit of {self.max_output} characters reached; output truncated"
+        elif not line.strip() and not stderr:
+            stderr = "Process was killed (resource limit exceeded)"
+        return returncode, stdout, stderr, resources
+
+
+def _kill_group(pgid: int):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _preload(modules: list):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def _run_child(conn: socket.socket, job: dict, memory_bytes: int):
+    """Body of a forked child: never returns."""
+    status = 1
+    try:
+        # Session (and group) leader, so the run's whole process tree can be killed
+        os.setsid()
+        if job.get('cgroup'):
+            with open(os.path.join(job['cgroup'], 'cgroup.procs'), 'w') as f:
+                f.write('0')
+        conn.sendall(f'{os.getpid()}\n'.encode('utf-8'))
+        run_dir = job['run_dir']
+        file_path = job['file_path']
+        os.chdir(run_dir)
+
+        cpu = int(job['timeout']) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_FILE_BYTES, MAX_FILE_BYTES))
+        if memory_bytes > 0:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        for fd, name in ((1, '.stdout'), (2, '.stderr')):
+            out = os.open(os.path.join(run_dir, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.dup2(out, fd)
+            os.close(out)
+
+        # Children share the zygote's PRNG state unless reseeded
+        import random
+        random.seed()
+        if 'numpy' in sys.modules:
+            sys.modules['numpy'].random.seed()
+
+        sys.argv = [file_path]
+        sys.path[0] = run_dir
+        importlib.invalidate_caches()
+        status = _exec_main(file_path, job['source'])
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        try:
+            # Peak RSS includes the preloaded modules shared with the zygote
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu_time = usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+            conn.sendall(f'{status} {cpu_time} {usage.ru_maxrss}\n'.encode('utf-8'))
+        except OSError:
+            pass
+        # Take background processes the program started down with us; while
+        # we are alive the group id cannot belong to anything else
+        try:
+            os.killpg(0, signal.SIGKILL)
+        finally:
+            os._exit(status)
+
+
+def _exec_main(file_path: str, source: str) -> int:
+    """Execute `source` like `python3 file_path` would; returns the exit status."""
+    main = type(sys)('__main__')
+    main.__file__ = file_path
+    sys.modules['__main__'] = main
+    # Lets tracebacks quote source lines although file_path is not on disk
+    linecache.cache[file_path] = (len(source), None, source.splitlines(True), file_path)
+    try:
+        code = compile(source, file_path, 'exec')
+        exec(code, main.__dict__)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except SyntaxError as e:
+        traceback.print_exception(type(e), e, None)
+        return 1
+    except BaseException as e:
+        # Hide this frame so the traceback matches a plain interpreter run
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    return 0
+
+
+def serve(socket_path: str, preload: list, memory_bytes: int):
+    """Zygote main loop: fork one child per connection."""
+    # Read before the (slow) preload: if the server dies meanwhile we must not
+    # mistake init for it and outlive it
+    parent = os.getppid()
+    _preload(preload)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # auto-reap children
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(64)
+
+    while os.getppid() == parent:
+        ready, _, _ = select.select([server], [], [], 1.0)
+        if not ready:
+            continue
+        conn, _ = server.accept()
+        conn.settimeout(5)
+        try:
+            job = json.loads(conn.makefile('r').readline())
+        except (OSError, ValueError):
+            conn.close()
+            continue
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            if os.fork() == 0:
+                server.close()
+                _run_child(conn, job, memory_bytes)
+        except OSError:
+            pass  # the client sees the connection close and falls back
+        conn.close()
+
+    os.unlink(socket_path)
+
+
+if __name__ == '__main__':
+    serve(
+        sys.argv[1],
+        [name for name in sys.argv[2].split(',') if name],
+        int(sys.argv[3])
+    )
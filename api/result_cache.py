@@ -0,0 +1,174 @@
+import collections
+import hashlib
+import json
+import re
+import threading
+import time
+
+# Source patterns that make a run's output depend on more than its inputs:
+# clocks, randomness, the network, the filesystem, processes, threads and
+# the environment. Programs matching these always run.
+NONDETERMINISTIC = {
+    'python': re.compile(
+        r'\b(?:time|datetime|random|secrets|uuid|socket|ssl|http|urllib|requests|os|subprocess|shutil|pathlib|'
+        r'glob|tempfile|io|threading|multiprocessing|asyncio|concurrent|signal|platform|getpass|__file__)\b'
+        r'|\b(?:open|input|id|hash|eval|exec|compile|__import__|globals|locals|vars)\s*\('
+    ),
+    'c': re.compile(
+        r'\b(?:time|clock|clock_gettime|gettimeofday|rand|random|srand|srandom|drand48|arc4random|getrandom|'
+        r'fopen|open|opendir|stat|getenv|getcwd|getpid|getppid|fork|system|popen|exec\w*|socket|connect|'
+        r'pthread_create|thrd_create|localtime|gmtime|ctime|asctime|signal|alarm|sleep|usleep|nanosleep)\s*\('
+        r'|\b__(?:FILE|DATE|TIME|TIMESTAMP)__\b|/dev/|%p\b'
+    ),
+    'java': re.compile(
+        r'\b(?:Random|SecureRandom|ThreadLocalRandom|UUID|Instant|Clock|LocalDate|LocalTime|LocalDateTime|'
+        r'ZonedDateTime|Date|Calendar|File|Files|Path|Paths|FileReader|FileInputStream|Socket|ServerSocket|'
+        r'URL|HttpClient|Thread|ExecutorService|Executors|CompletableFuture|ProcessBuilder|Runtime)\b'
+        r'|\b(?:currentTimeMillis|nanoTime|getenv|getProperty|hashCode|identityHashCode|random|'
+        r'parallelStream)\s*\(|\bjava\.(?:io|nio|net|time)\b'
+    ),
+    # Shell variables and commands that read the clock or the system, file
+    # input (`<`, heredocs aside) and background jobs (`&`, not `&&` or `>&`)
+    'bash': re.compile(
+        r'\$\$|\$\{?(?:RANDOM|SRANDOM|SECONDS|EPOCHSECONDS|EPOCHREALTIME|BASHPID|PPID|PWD|OLDPWD|HOME|TMPDIR)\b'
+        r'|\b(?:date|ls|cat|find|ps|curl|wget|hostname|uptime|df|du|free|who|whoami|id|uname|env|printenv|'
+        r'stat|head|tail|shuf|mktemp|sleep|top|nproc|pwd|source|eval)\b'
+        r'|(?<!<)<(?!<)|(?<![&>])&(?![&>])|/dev/|/proc/'
+    ),
+}
+
+
+def looks_deterministic(code: str, language: str) -> bool:
+    """False when `code` uses something that can change its output between runs."""
+    pattern = NONDETERMINISTIC.get(language)
+    return pattern is not None and pattern.search(code) is None
+
+
+class _Flight:
+    """A run in progress that identical requests can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    LRU + TTL cache for the results of deterministic runs, with request
+    coalescing.
+
+    Concurrent calls for the same key share a single run. A result is only
+    served from the cache after `confirmations` runs of its key produced the
+    same outcome; a key whose runs disagree is remembered as nondeterministic
+    and always runs from then on. This lowers the risk left by the source
+    scan (set ordering under hash randomization, racing threads) but does
+    not remove it: runs can agree by chance, and that result is then served
+    until it expires.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, confirmations: int = 2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.confirmations = max(confirmations, 1)
+        self._entries = collections.OrderedDict()
+        self._nondeterministic = collections.OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+    @staticmethod
+    def make_key(language: str, source: str, stdin: str, toolchain: str, options: dict) -> str:
+        """Hash everything that decides a run's result."""
+        digest = hashlib.sha256()
+        for part in (language, toolchain, json.dumps(options, sort_keys=True), stdin, source):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get_or_run(self, key: str, run) -> tuple:
+        """
+        Return (value, status) for `key`, where status is hit, miss, coalesced
+        or bypass (a nondeterministic key: run without the cache).
+        `run` returns (value, outcome); the value is cached once enough runs
+        produced equal outcomes, and an outcome of None (timeouts, transient
+        errors) is neither cached nor compared. If `run` raises, every
+        waiting caller sees the error.
+        """
+        with self._lock:
+            if key in self._nondeterministic:
+                self._stats['bypassed'] += 1
+                leader = None
+            else:
+                entry = self._get(key)
+                if entry is not None and entry['runs'] >= self.confirmations:
+                    self._stats['hits'] += 1
+                    return entry['value'], 'hit'
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self._stats['misses'] += 1
+                else:
+                    self._stats['coalesced'] += 1
+
+        if leader is None:
+            return run()[0], 'bypass'
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 'coalesced'
+
+        try:
+            flight.value, outcome = run()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            if outcome is not None:
+                self._record(key, flight.value, outcome)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, 'miss'
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'nondeterministic': len(self._nondeterministic),
+                'hits': self._stats['hits'],
+                'misses': self._stats['misses'],
+                'coalesced': self._stats['coalesced'],
+                'bypassed': self._stats['bypassed'],
+            }
+
+    def _get(self, key: str):
+        """Look `key` up, dropping it when expired. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['created'] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _record(self, key: str, value, outcome):
+        """Count a finished run towards confirming (or refuting) its key."""
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                self._entries[key] = {'value': value, 'outcome': outcome, 'runs': 1, 'created': time.time()}
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            elif entry['outcome'] == outcome:
+                entry['runs'] += 1
+            else:
+                del self._entries[key]
+                self._nondeterministic[key] = True
+                while len(self._nondeterministic) > self.max_entries:
+                    self._nondeterministic.popitem(last=False)
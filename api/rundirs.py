@@ -0,0 +1,90 @@
+import os
+import secrets
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RunDirPool:
+    """
+    Working directories for runs, created up front and reused.
+
+    `root` should be on a RAM-backed filesystem (/dev/shm) so sources,
+    compiler intermediates and captured output never reach a disk. A released
+    directory is emptied and handed to the next run; when all `size`
+    directories are busy an extra one is made and removed after use.
+    """
+
+    def __init__(self, root: str, size: int):
+        self.root = root
+        self.size = size
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._free = [self._create() for _ in range(size)]
+        self._in_use = 0
+        self._stats = {'acquired': 0, 'overflow': 0, 'discarded': 0}
+        self._scrub_time = 0.0
+
+    @contextmanager
+    def acquire(self):
+        """Yield an empty directory for the duration of one run."""
+        with self._lock:
+            path = self._free.pop() if self._free else None
+            self._in_use += 1
+            self._stats['acquired'] += 1
+            if path is None:
+                self._stats['overflow'] += 1
+        if path is None:
+            path = self._create()
+        try:
+            yield path
+        finally:
+            self._release(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            released = self._stats['acquired'] - self._in_use
+            return {
+                'root': self.root,
+                'size': self.size,
+                'free': len(self._free),
+                'in_use': self._in_use,
+                'acquired': self._stats['acquired'],
+                'overflow': self._stats['overflow'],
+                'discarded': self._stats['discarded'],
+                'avg_scrub_time': round(self._scrub_time / released, 6) if released else 0.0,
+            }
+
+    def _create(self) -> str:
+        path = os.path.join(self.root, secrets.token_hex(16))
+        os.mkdir(path, 0o700)
+        return path
+
+    def _release(self, path: str):
+        start = time.perf_counter()
+        clean = _scrub(path)
+        with self._lock:
+            self._scrub_time += time.perf_counter() - start
+            self._in_use -= 1
+            if clean and len(self._free) < self.size:
+                self._free.append(path)
+                return
+            if not clean:
+                self._stats['discarded'] += 1
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _scrub(path: str) -> bool:
+    """Empty `path` in place; False if something could not be removed."""
+    try:
+        os.chmod(path, 0o700)
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+        return True
+    except OSError:
+        return False
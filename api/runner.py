@@ -0,0 +1,192 @@
+"""
+Runner daemon: compiles and runs submissions for API servers started with
+EXECUTOR=remote (see executors.RemoteExecutor).
+
+    RUNNER_PORT=9001 python runner.py
+    RUNNER_HOST=0.0.0.0 RUNNER_TOKEN=<secret> python runner.py   # reachable from other machines
+
+Runners execute arbitrary code, so one listening beyond loopback refuses to
+start without RUNNER_TOKEN.
+
+Requests are JSON over HTTP:
+  POST /compile  {code, language, opt_level}         -> {response, status}
+  POST /batch    {code, language, cases, opt_level}  -> {response, status}
+  POST /stream   {code, language, opt_level}         -> Server-Sent Events
+  GET  /health   -> {status, queue_depth, running, capacity}
+  GET  /metrics  -> Prometheus metrics of this runner
+At most RUNNER_WORKERS requests run at once and RUNNER_QUEUE_SIZE more
+wait; past that the runner answers 503 and the API tries another runner.
+"""
+import os
+
+# A runner always executes locally, whatever the shared environment says
+os.environ['EXECUTOR'] = 'local'
+
+from logs import configure_logging  # noqa: E402
+configure_logging()
+
+import hmac  # noqa: E402
+import ipaddress  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import signal  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: E402
+
+from batch import run_batch, validate_cases  # noqa: E402
+from compile import bash_pool, compile_and_run, jvm_pool, python_pool  # noqa: E402
+from metrics import registry  # noqa: E402
+from streaming import stream_compile_and_run  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+RUNNER_HOST = os.environ.get('RUNNER_HOST', '127.0.0.1')
+RUNNER_PORT = int(os.environ.get('RUNNER_PORT', 9001))
+RUNNER_WORKERS = int(os.environ.get('RUNNER_WORKERS', os.cpu_count() or 2))
+RUNNER_QUEUE_SIZE = int(os.environ.get('RUNNER_QUEUE_SIZE', 4 * RUNNER_WORKERS))
+RUNNER_TOKEN = os.environ.get('RUNNER_TOKEN', '')
+MAX_BODY = 10 * 1024 * 1024  # bytes
+
+
+class Slots:
+    """Admission control: `workers` requests run, up to `queue_size` wait."""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.capacity = workers
+        self.queue_size = queue_size
+        self.waiting = 0
+        self.running = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> bool:
+        with self._cond:
+            if self.running >= self.capacity and self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            while self.running >= self.capacity:
+                self._cond.wait()
+            self.waiting -= 1
+            self.running += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.running -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {'queue_depth': self.waiting, 'running': self.running, 'capacity': self.capacity}
+
+
+slots = Slots(RUNNER_WORKERS, RUNNER_QUEUE_SIZE)
+
+
+class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.0: every response ends by closing the connection, streams included
+    protocol_version = 'HTTP/1.0'
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(dict(slots.stats(), status='ok'))
+        elif self.path == '/metrics':
+            self._send(200, registry.render().encode('utf-8'), 'text/plain; version=0.0.4')
+        else:
+            self._send_json({'error': 'Not found'}, 404)
+
+    def do_POST(self):
+        if RUNNER_TOKEN and not hmac.compare_digest(
+                self.headers.get('Authorization', ''), f'Bearer {RUNNER_TOKEN}'):
+            self._send_json({'error': 'Unauthorized'}, 401)
+            return
+        if self.path not in ('/compile', '/batch', '/stream'):
+            self._send_json({'error': 'Not found'}, 404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length > MAX_BODY:
+                raise ValueError("Request too large")
+            payload = json.loads(self.rfile.read(length))
+            code, language, opt_level = payload['code'], payload['language'], payload.get('opt_level')
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json({'error': f'Bad request: {e}'}, 400)
+            return
+
+        if not slots.acquire():
+            self._send_json({'error': 'Runner is busy'}, 503)
+            return
+        try:
+            if self.path == '/stream':
+                self._stream(stream_compile_and_run(code, language, opt_level))
+                return
+            if self.path == '/batch':
+                error = validate_cases(payload.get('cases'))
+                if error:
+                    self._send_json({'response': {'error': error}, 'status': 400})
+                    return
+                response, status = run_batch(code, language, payload['cases'], opt_level)
+            else:
+                response, status = compile_and_run(code, language, opt_level)
+            self._send_json({'response': response, 'status': status})
+        finally:
+            slots.release()
+
+    def _stream(self, events):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for event, data in events:
+                self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except OSError:
+            pass  # the API server went away; closing the generator stops the run
+        finally:
+            events.close()
+
+    def _send_json(self, body: dict, status: int = 200):
+        self._send(status, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def _send(self, status: int, data: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # a host name: assume it is reachable from elsewhere
+
+
+def main():
+    if not RUNNER_TOKEN and not is_loopback(RUNNER_HOST):
+        sys.exit(f"Refusing to listen on {RUNNER_HOST} without RUNNER_TOKEN: anyone could run code here")
+    server = ThreadingHTTPServer((RUNNER_HOST, RUNNER_PORT), Handler)
+    # On SIGTERM stop accepting, then wait for in-flight requests
+    server.daemon_threads = False
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("Runner listening", extra={'host': RUNNER_HOST, 'port': RUNNER_PORT, 'workers': RUNNER_WORKERS})
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        jvm_pool.close()
+        python_pool.stop()
+        bash_pool.close()
+        registry.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,412 @@
+import codecs
+import logging
+import math
+import os
+import secrets
+import selectors
+import shutil
+import signal
+import subprocess
+import time
+
+from metrics import span
+
+# Same cap as sanitize_output, but applied while the program is still running
+MAX_OUTPUT = 10000  # characters
+READ_SIZE = 4096
+IDLE_CHECK = 0.05  # seconds without output between checks that the run is still alive
+
+# What every run reports about itself (see pump_output)
+RESOURCE_KEYS = ('cpu_time', 'wall_time', 'peak_memory_kb', 'terminated_by')
+
+# Applies the rlimits between fork and exec (util-linux, part of every Debian base image)
+PRLIMIT = shutil.which('prlimit')
+# Moves itself into the cgroup given as $0, then execs the rest
+JOIN_CGROUP = 'echo 0 > "$0/cgroup.procs" && exec "$@"'
+
+logger = logging.getLogger(__name__)
+
+
+class SandboxedProcess(subprocess.Popen):
+    """A Popen that remembers the envelope it was started in."""
+
+    cgroup = None      # per-run cgroup directory, if cgroups are in use
+    cpu_limit = None   # seconds
+    released = False
+
+
+class Sandbox:
+    """
+    Starts submissions inside a per-run resource envelope.
+
+    Every run gets rlimits on CPU time, file size and (unless exempted)
+    address space, and runs in its own session so the whole process tree can
+    be killed. When `cgroup_root` is a writable, delegated cgroup v2 directory
+    each run also gets a child cgroup with memory.max and pids.max, which
+    covers everything the program forks and gives exact peak memory.
+
+    The process cap only exists with cgroups: RLIMIT_NPROC counts every
+    process and thread of the user, server included, so it cannot limit one
+    run. Nothing runs in Python between fork and exec (the server is
+    threaded); the command is started through `prlimit`, and through a
+    shell that joins the cgroup when there is one.
+    """
+
+    def __init__(self, memory_bytes: int, max_processes: int, file_bytes: int, cgroup_root: str = ''):
+        self.memory_bytes = memory_bytes
+        self.max_processes = max_processes
+        self.file_bytes = file_bytes
+        self.cgroup_root = cgroup_root if _enable_controllers(cgroup_root) else ''
+        if PRLIMIT is None:
+            logger.error("prlimit not found; submissions cannot be started")
+
+    def spawn(self, command: list, cwd: str, timeout: float, env: dict = None,
+              stdin=subprocess.DEVNULL, limit_address_space: bool = True,
+              pass_fds: tuple = ()) -> SandboxedProcess:
+        """Start `command` with piped stdout/stderr; pass the result to pump_output."""
+        if PRLIMIT is None:
+            raise OSError("prlimit is required to run submissions")
+        cpu_seconds = math.ceil(timeout) + 1
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        wrapped = [PRLIMIT, f'--cpu={cpu_seconds}:{cpu_seconds + 1}', f'--fsize={self.file_bytes}']
+        if limit_address_space and self.memory_bytes > 0:
+            wrapped.append(f'--as={self.memory_bytes}')
+        wrapped += ['--'] + list(command)
+
+        cgroup = self.create_cgroup()
+        if cgroup is not None:
+            wrapped = ['/bin/sh', '-c', JOIN_CGROUP, cgroup] + wrapped
+
+        try:
+            process = SandboxedProcess(
+                wrapped,
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=cwd,
+                env=env,
+                start_new_session=True,
+                pass_fds=pass_fds
+            )
+        except BaseException:
+            if cgroup is not None:
+                remove_cgroup(cgroup)
+            raise
+        process.cgroup = cgroup
+        process.cpu_limit = cpu_seconds
+        return process
+
+    def run(self, command: list, cwd: str, timeout: float, env: dict = None,
+            limit_address_space: bool = True, pass_fds: tuple = (),
+            max_output: int = MAX_OUTPUT) -> tuple:
+        """
+        Run `command` to completion.
+        Returns (CompletedProcess, result) where result is pump_output's
+        final 'exit' event.
+        """
+        stdout, stderr = [], []
+        start = time.monotonic()
+        with span('spawn'):
+            process = self.spawn(
+                command, cwd, timeout, env=env, limit_address_space=limit_address_space, pass_fds=pass_fds
+            )
+        try:
+            with span('execute'):
+                for event, data in pump_output(process, timeout, start, max_output):
+                    if event == 'stdout':
+                        stdout.append(data)
+                    elif event == 'stderr':
+                        stderr.append(data)
+                    else:
+                        result = data
+        finally:
+            release(process)
+        return subprocess.CompletedProcess(command, result['exit_code'], ''.join(stdout), ''.join(stderr)), result
+
+    def create_cgroup(self):
+        """A fresh per-run cgroup with the memory and process caps, or None without cgroups."""
+        if not self.cgroup_root:
+            return None
+        path = os.path.join(self.cgroup_root, f'run-{secrets.token_hex(8)}')
+        try:
+            os.mkdir(path)
+            if self.memory_bytes > 0:
+                _write(path, 'memory.max', self.memory_bytes)
+                if os.path.exists(os.path.join(path, 'memory.swap.max')):
+                    _write(path, 'memory.swap.max', 0)
+            if self.max_processes > 0:
+                _write(path, 'pids.max', self.max_processes)
+        except OSError as e:
+            logger.warning("Could not create cgroup %s, using rlimits only: %s", path, e)
+            remove_cgroup(path)
+            return None
+        return path
+
+
+def pump_output(process, timeout, start, max_output=MAX_OUTPUT):
+    """
+    Forward the child's pipes chunk by chunk until exit, timeout or output cap.
+    The final 'exit' event reports CPU time, wall time, peak memory and what
+    ended the run. Without cgroups peak memory is the peak RSS, which Linux
+    counts from before exec, so small programs report roughly the size of the
+    forking server process.
+    """
+    selector = selectors.DefaultSelector()
+    decoders = {}
+    for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr)):
+        os.set_blocking(pipe.fileno(), False)
+        selector.register(pipe, selectors.EVENT_READ, name)
+        decoders[name] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    deadline = start + timeout
+    remaining = max_output
+    wrote_stderr = False
+    reason = None
+    try:
+        while selector.get_map() and reason is None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                reason = 'timeout'
+                break
+            ready = selector.select(min(left, IDLE_CHECK))
+            if not ready and _exited(process):
+                # Only background children still hold the pipes open: they go too
+                break
+            for key, _ in ready:
+                data = os.read(key.fileobj.fileno(), READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                text = decoders[key.data].decode(data)[:remaining]
+                if not text:
+                    continue
+                remaining -= len(text)
+                wrote_stderr = wrote_stderr or key.data == 'stderr'
+                yield key.data, text
+                if remaining <= 0:
+                    reason = 'output_limit'
+                    break
+    finally:
+        selector.close()
+
+    if reason is None and not _wait_exit(process, deadline):
+        # Pipes closed early (e.g. the program closed stdout) but it kept running
+        reason = 'timeout'
+    # Nothing may outlive the run. The unreaped leader keeps the group id
+    # reserved, so this cannot hit an unrelated process group.
+    _kill_tree(process)
+    returncode, usage = _reap(process)
+
+    cpu_time = usage.ru_utime + usage.ru_stime
+    peak_memory_kb = usage.ru_maxrss
+    oom_killed = False
+    cgroup = process.cgroup
+    if cgroup is not None:
+        # The cgroup also sees forked children and processes still running
+        stats = _read_keyed(cgroup, 'cpu.stat')
+        if 'usage_usec' in stats:
+            cpu_time = stats['usage_usec'] / 1e6
+        peak = _read_int(cgroup, 'memory.peak')
+        if peak is not None:
+            peak_memory_kb = peak // 1024
+        oom_killed = _read_keyed(cgroup, 'memory.events').get('oom_kill', 0) > 0
+
+    if reason is None:
+        reason = _limit_reason(returncode, cpu_time, process.cpu_limit, oom_killed)
+
+    result = {
+        "success": reason == 'exit' and returncode == 0 and not wrote_stderr,
+        "exit_code": returncode,
+        "cpu_time": round(cpu_time, 4),
+        "wall_time": round(time.monotonic() - start, 4),
+        "peak_memory_kb": peak_memory_kb,
+    }
+    if reason == 'timeout':
+        result["error"] = f"Execution timed out after {timeout} seconds"
+    elif reason == 'output_limit':
+        result["error"] = f"Output limit of {max_output} characters reached; process killed"
+    elif reason == 'cpu_limit':
+        result["error"] = f"CPU time limit of {process.cpu_limit} seconds exceeded"
+    elif reason == 'memory_limit':
+        result["error"] = "Memory limit exceeded; process killed"
+    elif reason == 'file_size_limit':
+        result["error"] = "File size limit exceeded; process killed"
+    result["terminated_by"] = reason
+    yield 'exit', result
+
+
+def cap_output(stdout: str, stderr: str, max_output: int = MAX_OUTPUT) -> tuple:
+    """
+    Apply pump_output's cap to output collected some other way (the warm
+    pools): `max_output` characters in all, stdout first.
+    Returns (stdout, stderr, over_limit).
+    """
+    over_limit = len(stdout) + len(stderr) > max_output
+    stdout = stdout[:max_output]
+    return stdout, stderr[:max_output - len(stdout)], over_limit
+
+
+def read_output_files(run_dir: str, max_output: int = MAX_OUTPUT) -> tuple:
+    """cap_output for a run that wrote its output to run_dir/.stdout and .stderr."""
+    texts = []
+    for name in ('.stdout', '.stderr'):
+        try:
+            with open(os.path.join(run_dir, name), 'rb') as f:
+                # No character takes more than 4 bytes: one byte past that passes the cap
+                texts.append(f.read(4 * max_output + 1).decode('utf-8', errors='replace'))
+        except OSError:
+            texts.append("")
+    return cap_output(texts[0], texts[1], max_output)
+
+
+def release(process):
+    """
+    Kill whatever is left of the run's process tree and remove its cgroup.
+    Safe to call more than once, and on runs that are still going (e.g. when
+    a streaming client disconnects).
+    """
+    if process.released:
+        return
+    if process.returncode is None:
+        _kill_tree(process)
+        process.wait()
+    if process.cgroup is not None:
+        remove_cgroup(process.cgroup)
+    process.released = True
+
+
+def exit_reason(process, wait: float = 1.0) -> str:
+    """
+    What ended a sandboxed process that stopped on its own, as pump_output's
+    terminated_by. Waits up to `wait` seconds for it to exit, then kills it.
+    """
+    try:
+        process.wait(wait)
+    except subprocess.TimeoutExpired:
+        _kill_tree(process)
+        process.wait()
+    oom_killed = False
+    if process.cgroup is not None:
+        oom_killed = _read_keyed(process.cgroup, 'memory.events').get('oom_kill', 0) > 0
+    return _limit_reason(process.returncode, 0.0, process.cpu_limit, oom_killed)
+
+
+def _limit_reason(returncode, cpu_time, cpu_limit, oom_killed) -> str:
+    if oom_killed:
+        return 'memory_limit'
+    if returncode == -signal.SIGXCPU or (
+        returncode == -signal.SIGKILL and cpu_limit is not None and cpu_time >= cpu_limit
+    ):
+        return 'cpu_limit'
+    if returncode == -signal.SIGXFSZ:
+        return 'file_size_limit'
+    if returncode is not None and returncode < 0:
+        return 'signal'
+    return 'exit'
+
+
+def _kill_tree(process):
+    if process.cgroup is not None:
+        kill_cgroup(process.cgroup)
+    try:
+        # The run is a session leader, so this reaches everything it forked
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _exited(process) -> bool:
+    """Whether the run's main process has exited, without reaping it."""
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
+
+
+def _wait_exit(process, deadline) -> bool:
+    """Poll until the main process exits (True) or `deadline` passes (False)."""
+    delay = 0.001
+    while not _exited(process):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+    return True
+
+
+def _reap(process):
+    """
+    Reap `process` with os.wait4 so its resource usage is not lost.
+    Returns (returncode, rusage).
+    """
+    _, status, usage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return process.returncode, usage
+
+
+def _enable_controllers(root: str) -> bool:
+    """Check that `root` can hand memory and pids controllers to per-run cgroups."""
+    if not root:
+        return False
+    control = os.path.join(root, 'cgroup.subtree_control')
+    try:
+        with open(control, 'w') as f:
+            f.write('+memory +pids')
+    except OSError:
+        pass  # already enabled, or not permitted: the read below decides
+    try:
+        with open(control) as f:
+            enabled = f.read().split()
+    except OSError:
+        enabled = []
+    if 'memory' in enabled and 'pids' in enabled:
+        return True
+    logger.warning("cgroup v2 controllers unavailable under %r; using rlimits only", root)
+    return False
+
+
+def kill_cgroup(path: str):
+    """SIGKILL everything in the cgroup at `path`."""
+    try:
+        _write(path, 'cgroup.kill', 1)
+    except OSError:
+        pass  # before Linux 5.14; callers also kill the process group
+
+
+def remove_cgroup(path: str):
+    """Remove a per-run cgroup once its processes are gone."""
+    # Killed processes can take a moment to leave the cgroup
+    for _ in range(50):
+        try:
+            os.rmdir(path)
+            return
+        except FileNotFoundError:
+            return
+        except OSError:
+            time.sleep(0.01)
+    logger.warning("Could not remove cgroup %s", path)
+
+
+def _write(cgroup: str, name: str, value):
+    with open(os.path.join(cgroup, name), 'w') as f:
+        f.write(str(value))
+
+
+def _read_int(cgroup: str, name: str):
+    try:
+        with open(os.path.join(cgroup, name)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_keyed(cgroup: str, name: str) -> dict:
+    """Parse a flat-keyed cgroup file such as cpu.stat or memory.events."""
+    try:
+        with open(os.path.join(cgroup, name)) as f:
+            return {key: int(value) for key, value in (line.split() for line in f if line.strip())}
+    except (OSError, ValueError):
+        return {}
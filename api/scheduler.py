@@ -0,0 +1,262 @@
+import collections
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class QueueFull(Exception):
+    """The scheduler is at capacity; the client should retry later."""
+
+
+class Job:
+    """One submitted compile/run request and its eventual result."""
+
+    def __init__(self, language: str, args: tuple):
+        self.id = secrets.token_hex(16)
+        self.language = language
+        self.args = args
+        self.status = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> dict:
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'language': self.language,
+        }
+        if self.started is not None:
+            data['wait_time'] = round(self.started - self.submitted, 4)
+        if self.finished is not None:
+            data['run_time'] = round(self.finished - self.started, 4)
+            data['result'], data['result_status'] = self.result
+        return data
+
+
+class JobScheduler:
+    """
+    Runs jobs on a fixed set of worker threads.
+
+    At most `queue_size` jobs wait at once (submit raises QueueFull past that)
+    and at most `language_limits[language]` jobs of one language run at once;
+    a job that would exceed its cap is skipped so other languages keep moving.
+    Finished jobs are kept for `result_ttl` seconds for clients to collect.
+
+    With several server processes, give them a shared `spool_dir`: each job's
+    state is mirrored there so any process can answer a poll for it.
+    """
+
+    def __init__(self, run, workers: int, queue_size: int, language_limits: dict, result_ttl: float,
+                 spool_dir: str = None):
+        self._run = run
+        self.workers = workers
+        self.queue_size = queue_size
+        self.language_limits = language_limits
+        self.result_ttl = result_ttl
+        self.spool_dir = spool_dir
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        self._closed = False
+        self._last_sweep = time.time()
+
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._running = collections.Counter()
+        self._jobs = {}
+        self._wait_times = collections.deque(maxlen=1000)
+        self._counts = collections.Counter()
+
+        for index in range(workers):
+            threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True).start()
+
+    def submit(self, language: str, *args) -> Job:
+        """Queue `run(*args)`; raises QueueFull when the queue is at capacity."""
+        job = Job(language, args)
+        self._sweep_spool()
+        # Spooled before a worker can see it, so 'queued' never overwrites a later state
+        self._spool(job)
+        with self._cond:
+            self._expire()
+            if self._closed or len(self._pending) >= self.queue_size:
+                self._counts['rejected'] += 1
+                self._unspool(job)
+                if self._closed:
+                    raise QueueFull("Server is shutting down")
+                raise QueueFull(f"Job queue is full ({self.queue_size} waiting)")
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self._counts['submitted'] += 1
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id: str, wait: float = 0):
+        """Look up a job, optionally blocking up to `wait` seconds for it to finish."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is not None and wait > 0:
+            job.done.wait(wait)
+        return job
+
+    def status(self, job_id: str, wait: float = 0):
+        """
+        Like get(), but returns the job's to_dict(), and also finds jobs
+        submitted to other processes sharing the spool directory.
+        """
+        job = self.get(job_id, wait)
+        if job is not None:
+            return job.to_dict()
+        if not self.spool_dir or not JOB_ID.fullmatch(job_id):
+            return None
+        deadline = time.monotonic() + wait
+        while True:
+            data = self._read_spool(job_id)
+            if data is None or data['status'] == 'done' or time.monotonic() >= deadline:
+                return data
+            time.sleep(0.1)
+
+    def shutdown(self, timeout: float) -> bool:
+        """
+        Refuse new jobs and wait up to `timeout` seconds for queued and
+        running ones to finish. Returns True if everything finished.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._closed = True
+            while self._pending or any(self._running.values()):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def stats(self) -> dict:
+        """Queue depth, running jobs and recent wait-time percentiles."""
+        with self._cond:
+            waits = sorted(self._wait_times)
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': len(self._pending),
+                'queued_by_language': dict(collections.Counter(job.language for job in self._pending)),
+                'running_by_language': {lang: n for lang, n in self._running.items() if n},
+                'submitted': self._counts['submitted'],
+                'rejected': self._counts['rejected'],
+                'completed': self._counts['completed'],
+                'wait_time': {
+                    'p50': _percentile(waits, 0.50),
+                    'p95': _percentile(waits, 0.95),
+                    'max': round(waits[-1], 4) if waits else 0.0,
+                },
+            }
+
+    def _next_job(self):
+        """Pop the oldest job whose language is under its concurrency cap."""
+        for job in self._pending:
+            limit = self.language_limits.get(job.language, self.workers)
+            if self._running[job.language] < limit:
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.language] += 1
+                job.status = 'running'
+                job.started = time.time()
+                self._wait_times.append(job.started - job.submitted)
+            self._spool(job)
+
+            try:
+                result = self._run(*job.args)
+            except Exception as e:
+                result = ({"success": False, "stdout": "", "error": str(e)}, 200)
+
+            job.result = result
+            job.finished = time.time()
+            job.status = 'done'
+            self._spool(job)
+            with self._cond:
+                self._running[job.language] -= 1
+                self._counts['completed'] += 1
+                job.done.set()
+                # A slot for this language opened up
+                self._cond.notify_all()
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _spool_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f'{job_id}.json')
+
+    def _spool(self, job: Job):
+        if not self.spool_dir:
+            return
+        path = self._spool_path(job.id)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError):
+            pass  # other processes just won't see this job
+
+    def _unspool(self, job: Job):
+        if self.spool_dir:
+            try:
+                os.unlink(self._spool_path(job.id))
+            except OSError:
+                pass
+
+    def _read_spool(self, job_id: str):
+        try:
+            with open(self._spool_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _sweep_spool(self):
+        """Delete spooled jobs past the result TTL, at most a few times per TTL."""
+        now = time.time()
+        if not self.spool_dir or now - self._last_sweep < self.result_ttl / 10:
+            return
+        self._last_sweep = now
+        try:
+            with os.scandir(self.spool_dir) as entries:
+                for entry in entries:
+                    if entry.stat().st_mtime < now - self.result_ttl:
+                        os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return round(sorted_values[index], 4)
+
+
+def parse_limits(spec: str) -> dict:
+    """Parse 'java=2,c=4' into {'java': 2, 'c': 4}."""
+    limits = {}
+    for item in spec.split(','):
+        if '=' in item:
+            language, limit = item.split('=', 1)
+            limits[language.strip()] = int(limit)
+    return limits
@@ -0,0 +1,63 @@
+import time
+from contextlib import ExitStack
+
+from compile import ALLOWED_LANGUAGES, compile_cached, get_run_command, open_source, run_dirs, spawn_run
+from manpage import ManPageFormatter
+from sandbox import pump_output, release
+
+
+def stream_compile_and_run(code, language, opt_level=None):
+    """
+    Compile and run `code`, yielding (event, data) pairs as output arrives:
+      ('compile', {...cache info})       after a cached or fresh compile
+      ('stdout', str) / ('stderr', str)  output chunks, in arrival order
+      ('exit', {...})                    always last
+    The process is killed as soon as sandbox.MAX_OUTPUT characters have been
+    forwarded, so memory stays bounded however much the program prints.
+    """
+    lang_config = ALLOWED_LANGUAGES.get(language)
+    if not lang_config:
+        yield 'exit', {"success": False, "error": f"Language '{language}' not supported."}
+        return
+
+    process = None
+    with run_dirs.acquire() as run_dir, ExitStack() as cleanup:
+        try:
+            try:
+                file_path = cleanup.enter_context(open_source(code, language, run_dir))
+            except Exception as e:
+                yield 'exit', {"success": False, "error": str(e)}
+                return
+
+            if lang_config.get('compile_command'):
+                success, compile_error, cache_info = compile_cached(code, file_path, language, run_dir, opt_level)
+                yield 'compile', cache_info
+                if not success:
+                    yield 'exit', {"success": False, "error": f"Compilation error: {compile_error}"}
+                    return
+
+            start = time.monotonic()
+            process = spawn_run(language, get_run_command(language, file_path, run_dir), run_dir)
+            events = pump_output(process, lang_config['timeout'], start)
+            if language == 'bash':
+                # Same man page cleanup as compile_and_run, applied as chunks arrive
+                events = _format_stdout(events)
+            yield from events
+        finally:
+            # Also reached when the client disconnects mid-stream
+            if process is not None:
+                release(process)
+
+
+def _format_stdout(events):
+    formatter = ManPageFormatter()
+    for event, data in events:
+        if event == 'stdout':
+            data = formatter.feed(data)
+            if not data:
+                continue
+        elif event == 'exit':
+            rest = formatter.finish()
+            if rest:
+                yield 'stdout', rest
+        yield event, data
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from bash_pool import BASH_ENV, BashPool
+from sandbox import PRLIMIT, Sandbox
+
+pytestmark = pytest.mark.skipif(PRLIMIT is None, reason="needs prlimit")
+
+SCRIPTS = [
+    'exit 4',
+    'false',
+    'return 3; echo "after $?"',
+    'f() { return 5; }; f',
+    'echo "$0 ${BASH_SOURCE[0]} $SHLVL"',
+    'echo out; echo err >&2; kill -TERM $$',
+]
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = BashPool(1, Sandbox(0, 0, 1 << 24), max_output=10000)
+    deadline = time.monotonic() + 10
+    while pool._idle.empty():
+        assert time.monotonic() < deadline, "no bash worker became idle"
+        time.sleep(0.05)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize('script', SCRIPTS)
+def test_matches_a_fresh_bash(pool, script, tmp_path):
+    pooled_dir = tmp_path / 'pooled'
+    fresh_dir = tmp_path / 'fresh'
+    pooled_dir.mkdir()
+    fresh_dir.mkdir()
+
+    returncode, stdout, stderr, resources = pool.run(script, str(pooled_dir), 5)
+
+    (fresh_dir / 'source.sh').write_text(script)
+    process, result = Sandbox(0, 0, 1 << 24).run(['bash', 'source.sh'], str(fresh_dir), 5, env=BASH_ENV)
+
+    # The pool reports the shell's view of a signal (128 + n), Popen a negative number
+    expected = process.returncode if process.returncode >= 0 else 128 - process.returncode
+    assert (returncode, stdout, stderr) == (expected, process.stdout, process.stderr)
+    assert resources['terminated_by'] == result['terminated_by']
+
+
+def test_jobs_do_not_share_state(pool, tmp_path):
+    pool.run('x=1; f() { :; }; cd /; export LEAK=1; set -e', str(tmp_path), 5)
+    _, stdout, stderr, _ = pool.run('echo "x=$x LEAK=$LEAK"; type f; pwd; echo "$-"', str(tmp_path), 5)
+    assert stdout == f"x= LEAK=\n{tmp_path}\nhB\n"
+    assert "f: not found" in stderr
+
+
+def test_output_limit(pool, tmp_path):
+    returncode, stdout, stderr, resources = pool.run('yes | head -c 100000', str(tmp_path), 5)
+    assert len(stdout) == 10000
+    assert resources['terminated_by'] == 'output_limit'
+    assert "Output limit" in stderr
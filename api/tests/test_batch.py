@@ -0,0 +1,26 @@
+import pytest
+
+from batch import MAX_BATCH_CASES, validate_cases
+
+
+@pytest.mark.parametrize('cases', [
+    [{}],
+    [{'stdin': '1 2\n'}, {'args': ['-v', 'x']}],
+    [{'stdin': '', 'args': []}] * MAX_BATCH_CASES,
+])
+def test_valid_cases(cases):
+    assert validate_cases(cases) == ""
+
+
+@pytest.mark.parametrize('cases, error', [
+    (None, "'cases' must be a non-empty list."),
+    ({'stdin': ''}, "'cases' must be a non-empty list."),
+    ([], "'cases' must be a non-empty list."),
+    ([{}] * (MAX_BATCH_CASES + 1), f"At most {MAX_BATCH_CASES} cases are allowed per batch."),
+    (['1 2'], "Each case must be an object with optional 'stdin' and 'args'."),
+    ([{'stdin': 12}], "'stdin' must be a string."),
+    ([{'args': '-v'}], "'args' must be a list of strings."),
+    ([{'args': ['-n', 3]}], "'args' must be a list of strings."),
+])
+def test_invalid_cases(cases, error):
+    assert validate_cases(cases) == error
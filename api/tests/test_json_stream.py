@@ -0,0 +1,54 @@
+from json_stream import FieldStreamParser
+
+
+def collect(chunks):
+    """Feed `chunks` and join the fragments of each key, checking completion."""
+    parser = FieldStreamParser()
+    values, complete = {}, set()
+    for chunk in chunks:
+        for key, fragment, done in parser.feed(chunk):
+            assert key not in complete
+            values[key] = values.get(key, '') + fragment
+            if done:
+                complete.add(key)
+    return values, complete
+
+
+def test_whole_object():
+    values, complete = collect(['{"code": "print(1)", "language": "python"}'])
+    assert values == {'code': 'print(1)', 'language': 'python'}
+    assert complete == {'code', 'language'}
+
+
+def test_one_character_at_a_time():
+    text = '{"code": "a\\n\\"b\\"\\t\\u00e9\\ud83d\\ude00\\\\", "language": "c"}'
+    values, complete = collect(list(text))
+    assert values == {'code': 'a\n"b"\té\U0001F600\\', 'language': 'c'}
+    assert complete == {'code', 'language'}
+
+
+def test_partial_value_is_not_complete():
+    parser = FieldStreamParser()
+    assert parser.feed('{"code": "int ma') == [('code', 'int ma', False)]
+    assert parser.feed('in()"') == [('code', 'in()', True)]
+
+
+def test_skips_non_string_values():
+    text = '{"n": 12, "nested": {"x": "}", "y": [1, "]"]}, "ok": true, "code": "x"}'
+    values, _ = collect([text])
+    assert values == {'code': 'x'}
+
+
+def test_ignores_text_before_the_object():
+    values, _ = collect(['Here you go:\n```json\n', '{"code": "x"}\n```'])
+    assert values == {'code': 'x'}
+
+
+def test_escaped_key():
+    values, _ = collect(['{"co\\"de": "x"}'])
+    assert values == {'co"de': 'x'}
+
+
+def test_stops_after_the_object():
+    values, _ = collect(['{"code": "x"} {"code": "y"}'])
+    assert values == {'code': 'x'}
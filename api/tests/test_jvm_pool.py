@@ -0,0 +1,94 @@
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from jvm_pool import JvmPool
+from sandbox import Sandbox
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('java') is None or shutil.which('javac') is None, reason="needs a JDK"
+)
+
+HELLO = '''
+public class Main {
+    public static void main(String[] args) {
+        System.out.println("hello");
+    }
+}
+'''
+
+BROKEN = '''
+public class Main {
+    public static void main(String[] args) {
+        System.out.println("hello")
+    }
+}
+'''
+
+EXIT = '''
+public class Main {
+    public static void main(String[] args) {
+        System.out.println("before");
+        System.exit(3);
+    }
+}
+'''
+
+LOOP = '''
+public class Main {
+    public static void main(String[] args) {
+        while (true) {
+        }
+    }
+}
+'''
+
+
+def wait_for_worker(pool, timeout=60):
+    """Workers start in the background; run() only takes an idle one."""
+    deadline = time.monotonic() + timeout
+    while pool._idle.empty():
+        assert pool.available, "JVM worker could not be started"
+        assert time.monotonic() < deadline, "no JVM worker became idle"
+        time.sleep(0.1)
+
+
+@pytest.fixture
+def pool():
+    pool = JvmPool(1, 10, 10000, Sandbox(0, 0, 1 << 24))
+    wait_for_worker(pool)
+    yield pool
+    pool.close()
+
+
+def test_hello_world(pool):
+    compiled, _, exit_code, stdout, stderr, resources = pool.run('Main', HELLO, 5)
+    assert compiled
+    assert (exit_code, stdout, stderr) == (0, "hello\n", "")
+    assert resources['terminated_by'] == 'exit'
+    assert resources['wall_time'] >= 0 and resources['cpu_time'] >= 0
+
+
+def test_compile_error(pool):
+    compiled, diagnostics, exit_code, stdout, stderr, resources = pool.run('Main', BROKEN, 5)
+    assert not compiled
+    assert "';' expected" in diagnostics
+    assert exit_code is None and stdout is None and stderr is None and resources is None
+
+
+def test_system_exit(pool):
+    compiled, _, exit_code, _, _, _ = pool.run('Main', EXIT, 5)
+    assert compiled
+    assert exit_code == 3
+    # The worker survives a trapped exit (or is replaced) and keeps serving
+    wait_for_worker(pool)
+    assert pool.run('Main', HELLO, 5)[3] == "hello\n"
+
+
+def test_timeout_replaces_worker(pool):
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.run('Main', LOOP, 1)
+    wait_for_worker(pool)
+    assert pool.run('Main', HELLO, 5)[3] == "hello\n"
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from llm_cache import LLMCache
+
+
+def test_computes_once_and_counts_saved_tokens():
+    cache = LLMCache(max_entries=10, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ('code', 'python'), 120
+
+    assert cache.get_or_compute('k', compute) == ('code', 'python')
+    assert cache.get_or_compute('k', compute) == ('code', 'python')
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['saved_tokens']) == (1, 1, 120)
+
+
+def test_concurrent_callers_share_one_call():
+    cache = LLMCache(max_entries=10, ttl=60)
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value', 10
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))))
+    threads[1].start()
+    while cache.stats()['coalesced'] == 0:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['value', 'value']
+    assert len(calls) == 1
+    assert cache.stats()['saved_tokens'] == 10
+
+
+def test_errors_are_not_cached():
+    cache = LLMCache(max_entries=10, ttl=60)
+
+    def fail():
+        raise TimeoutError("upstream")
+
+    with pytest.raises(TimeoutError):
+        cache.get_or_compute('k', fail)
+    assert cache.get_or_compute('k', lambda: ('ok', 1)) == 'ok'
+
+
+def test_lookup_and_store():
+    cache = LLMCache(max_entries=10, ttl=60)
+    assert cache.lookup('k') is None
+    cache.store('k', ('streamed',), 5)
+    assert cache.lookup('k') == ('streamed',)
+    assert cache.stats()['misses'] == 1
+
+
+def test_entries_expire():
+    cache = LLMCache(max_entries=10, ttl=0)
+    cache.store('k', 'old', 1)
+    time.sleep(0.01)
+    assert cache.lookup('k') is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = LLMCache(max_entries=2, ttl=60, directory=str(tmp_path))
+    cache.store('a', ('a',), 1)
+    cache.store('b', ('b',), 1)
+    cache.lookup('a')
+    cache.store('c', ('c',), 1)
+    assert cache.lookup('b') is None
+    assert cache.lookup('a') == ('a',)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['a.json', 'c.json']
+
+
+def test_entries_survive_a_restart(tmp_path):
+    LLMCache(max_entries=10, ttl=60, directory=str(tmp_path)).store('k', ('code', 'c'), 7)
+    restarted = LLMCache(max_entries=10, ttl=60, directory=str(tmp_path))
+    assert restarted.lookup('k') == ('code', 'c')
+    assert restarted.stats()['saved_tokens'] == 7
+
+
+def test_unreadable_files_are_misses(tmp_path):
+    (tmp_path / 'k.json').write_text('{not json')
+    assert LLMCache(max_entries=10, ttl=60, directory=str(tmp_path)).lookup('k') is None
+
+
+def test_make_key_ignores_trailing_whitespace_only():
+    key = LLMCache.make_key(model='m', messages=[{'role': 'user', 'content': 'int x;\nx = 1;'}])
+    assert LLMCache.make_key(model='m', messages=[{'role': 'user', 'content': 'int x;  \nx = 1;\n\n'}]) == key
+    assert LLMCache.make_key(model='m', messages=[{'role': 'user', 'content': 'int x;\n  x = 1;'}]) != key
+    assert LLMCache.make_key(model='other', messages=[{'role': 'user', 'content': 'int x;\nx = 1;'}]) != key
@@ -0,0 +1,81 @@
+import os
+import time
+
+from metrics import Registry, collect_timings, registry, span, stop_timings
+
+
+def test_counters_and_labels():
+    metrics = Registry()
+    metrics.describe('runs_total', 'counter', 'Runs.')
+    metrics.inc('runs_total', language='c', outcome='success')
+    metrics.inc('runs_total', 2, outcome='success', language='c')
+    metrics.inc('runs_total', language='bash', outcome='say "hi"\n')
+    text = metrics.render()
+    assert '# HELP runs_total Runs.\n# TYPE runs_total counter\n' in text
+    assert 'runs_total{language="c",outcome="success"} 3\n' in text
+    assert 'runs_total{language="bash",outcome="say \\"hi\\"\\n"} 1\n' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Registry()
+    metrics.observe('latency_seconds', 0.003)
+    metrics.observe('latency_seconds', 0.2)
+    metrics.observe('latency_seconds', 100)
+    lines = metrics.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.001"} 0' in lines
+    assert 'latency_seconds_bucket{le="0.005"} 1' in lines
+    assert 'latency_seconds_bucket{le="0.25"} 2' in lines
+    assert 'latency_seconds_bucket{le="30.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'latency_seconds_count 3' in lines
+    assert 'latency_seconds_sum 100.203' in lines
+
+
+def test_collected_values_and_failing_readers():
+    metrics = Registry()
+    metrics.collect('queue_depth', 'gauge', 'Waiting jobs.', lambda: 4)
+    metrics.collect('cache_total', 'counter', 'Lookups.', lambda: {(('result', 'hit'),): 2})
+    metrics.collect('broken', 'gauge', 'Raises.', lambda: 1 / 0)
+    text = metrics.render()
+    assert 'queue_depth 4\n' in text
+    assert 'cache_total{result="hit"} 2\n' in text
+    assert 'broken ' not in text
+
+
+def test_processes_sharing_a_directory_add_up(tmp_path):
+    first = Registry(str(tmp_path), interval=3600)
+    second = Registry(str(tmp_path), interval=3600)
+    for metrics in (first, second):
+        metrics.describe('queue_depth', 'gauge', 'Waiting jobs.')
+        metrics.inc('requests_total')
+        metrics.collect('queue_depth', 'gauge', 'Waiting jobs.', lambda: 1)
+    second.flush()
+    text = first.render()
+    assert 'requests_total 2\n' in text
+    assert 'queue_depth 2\n' in text
+
+    # Gauges of a process that stopped writing snapshots are dropped, counters kept
+    snapshot = next(path for path in tmp_path.iterdir() if str(path) != first._snapshot_path)
+    stale = time.time() - 3600
+    os.utime(snapshot, (stale, stale))
+    text = first.render()
+    assert 'requests_total 2\n' in text
+    assert 'queue_depth 1\n' in text
+
+
+def test_span_records_request_timings():
+    token = collect_timings()
+    with span('compile'):
+        time.sleep(0.01)
+    with span('compile'):
+        pass
+    timings = stop_timings(token)
+    assert list(timings) == ['compile']
+    assert timings['compile'] >= 10
+    assert 'phase_seconds_count{phase="compile"}' in registry.render()
+
+
+def test_span_without_collection():
+    with span('setup'):
+        pass
+    assert stop_timings(collect_timings()) == {}
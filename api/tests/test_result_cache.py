@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from result_cache import ResultCache, looks_deterministic
+
+
+def counting_run(value):
+    """A run whose outcome is its value, and the list of its calls."""
+    calls = []
+
+    def run():
+        calls.append(1)
+        return value, value
+
+    return run, calls
+
+
+def test_served_once_runs_agree():
+    cache = ResultCache(max_entries=10, ttl=60, confirmations=2)
+    run, calls = counting_run('42')
+    assert cache.get_or_run('k', run) == ('42', 'miss')
+    assert cache.get_or_run('k', run) == ('42', 'miss')
+    assert cache.get_or_run('k', run) == ('42', 'hit')
+    assert len(calls) == 2
+
+
+def test_disagreeing_runs_are_never_cached():
+    cache = ResultCache(max_entries=10, ttl=60, confirmations=2)
+    outputs = iter(['a', 'b', 'c'])
+
+    def run():
+        value = next(outputs)
+        return value, value
+
+    cache.get_or_run('k', run)
+    cache.get_or_run('k', run)
+    assert cache.get_or_run('k', run) == ('c', 'bypass')
+    assert cache.stats()['nondeterministic'] == 1
+
+
+def test_outcome_none_is_not_cached():
+    cache = ResultCache(max_entries=10, ttl=60, confirmations=1)
+
+    def run():
+        return 'timed out', None
+
+    cache.get_or_run('k', run)
+    assert cache.get_or_run('k', run)[1] == 'miss'
+    assert cache.stats()['entries'] == 0
+
+
+def test_expired_entries_run_again():
+    cache = ResultCache(max_entries=10, ttl=0, confirmations=1)
+    run, calls = counting_run('x')
+    cache.get_or_run('k', run)
+    assert cache.get_or_run('k', run)[1] == 'miss'
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2, ttl=60, confirmations=1)
+    for key in ('a', 'b', 'c'):
+        cache.get_or_run(key, counting_run(key)[0])
+    assert cache.get_or_run('a', counting_run('a')[0])[1] == 'miss'
+    assert cache.get_or_run('c', counting_run('c')[0])[1] == 'hit'
+
+
+def test_concurrent_requests_share_one_run():
+    cache = ResultCache(max_entries=10, ttl=60, confirmations=2)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def run():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'x', 'x'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_run('k', run)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(cache.get_or_run('k', run)))
+    follower.start()
+    while cache.stats()['coalesced'] == 0:
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    follower.join()
+    assert sorted(results) == [('x', 'coalesced'), ('x', 'miss')]
+    assert len(calls) == 1
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    cache = ResultCache(max_entries=10, ttl=60, confirmations=1)
+
+    def run():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_run('k', run)
+    assert cache.get_or_run('k', counting_run('x')[0]) == ('x', 'miss')
+
+
+def test_make_key_covers_every_input():
+    base = ('python', 'print(1)', '', 'Python 3.8', {'opt_level': None})
+    key = ResultCache.make_key(*base)
+    assert ResultCache.make_key(*base) == key
+    for index, changed in enumerate(('c', 'print(2)', 'x', 'Python 3.9', {'opt_level': 'O2'})):
+        parts = list(base)
+        parts[index] = changed
+        assert ResultCache.make_key(*parts) != key
+
+
+@pytest.mark.parametrize('code, language, expected', [
+    ('print(sum(range(10)))', 'python', True),
+    ('import random\nprint(random.random())', 'python', False),
+    ('print(open("x").read())', 'python', False),
+    ('int main() { printf("%d", 1 + 1); }', 'c', True),
+    ('int main() { srand(time(0)); }', 'c', False),
+    ('class A { void f() { System.out.println(1); } }', 'java', True),
+    ('class A { void f() { new Random(); } }', 'java', False),
+    ('echo $((6 * 7))', 'bash', True),
+    ('echo $RANDOM', 'bash', False),
+    ('sleep 1 & wait', 'bash', False),
+    ('true && echo ok 2>&1', 'bash', True),
+    ('print(1)', 'cobol', False),
+])
+def test_looks_deterministic(code, language, expected):
+    assert looks_deterministic(code, language) is expected
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import JobScheduler, QueueFull, parse_limits
+
+
+def make_scheduler(run, workers=2, queue_size=10, limits=None, **kwargs):
+    return JobScheduler(run, workers, queue_size, limits or {}, result_ttl=60, **kwargs)
+
+
+def test_runs_jobs_and_keeps_results():
+    scheduler = make_scheduler(lambda code, language: ({'stdout': code}, 200))
+    job = scheduler.submit('python', 'print(1)', 'python')
+    status = scheduler.status(job.id, wait=5)
+    assert status['status'] == 'done'
+    assert (status['result'], status['result_status']) == ({'stdout': 'print(1)'}, 200)
+    assert status['wait_time'] >= 0 and status['run_time'] >= 0
+    assert scheduler.stats()['completed'] == 1
+
+
+def test_failed_run_becomes_an_error_result():
+    def run():
+        raise RuntimeError("boom")
+
+    scheduler = make_scheduler(run)
+    status = scheduler.status(scheduler.submit('c').id, wait=5)
+    assert status['result'] == {"success": False, "stdout": "", "error": "boom"}
+
+
+def test_queue_full():
+    scheduler = make_scheduler(lambda: None, workers=0, queue_size=2)
+    scheduler.submit('c')
+    scheduler.submit('c')
+    with pytest.raises(QueueFull):
+        scheduler.submit('c')
+    stats = scheduler.stats()
+    assert (stats['queue_depth'], stats['rejected']) == (2, 1)
+
+
+def test_language_limit_lets_other_languages_through():
+    release = threading.Event()
+    scheduler = make_scheduler(lambda language: release.wait(5) and (language, 200), workers=3,
+                               limits={'java': 1})
+    first = scheduler.submit('java', 'java')
+    second = scheduler.submit('java', 'java')
+    other = scheduler.submit('c', 'c')
+
+    # With java capped at one, the second java job waits while c runs
+    assert wait_for(lambda: first.status == 'running' and other.status == 'running')
+    assert second.status == 'queued'
+    release.set()
+    assert scheduler.status(second.id, wait=5)['status'] == 'done'
+
+
+def test_shutdown_refuses_new_jobs():
+    scheduler = make_scheduler(lambda: ({}, 200))
+    assert scheduler.shutdown(5)
+    with pytest.raises(QueueFull):
+        scheduler.submit('c')
+
+
+def test_shared_spool_answers_for_other_processes(tmp_path):
+    owner = make_scheduler(lambda: ({'stdout': 'x'}, 200), spool_dir=str(tmp_path))
+    other = make_scheduler(lambda: None, workers=0, spool_dir=str(tmp_path))
+    job = owner.submit('python')
+    assert other.status(job.id, wait=5)['result'] == {'stdout': 'x'}
+    assert other.status('0' * 32) is None
+    assert other.status('../../etc/passwd') is None
+
+
+def test_parse_limits():
+    assert parse_limits('java=2, c=4') == {'java': 2, 'c': 4}
+    assert parse_limits('') == {}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
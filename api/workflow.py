@@ -0,0 +1,77 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from compile import ALLOWED_LANGUAGES
+from llm import generate_tests, stream_code
+from llm_client import LLMError
+
+logger = logging.getLogger(__name__)
+
+
+def run_workflow(executor, img_url=None, img_base64=None, opt_level=None):
+    """
+    Transcribe an image, generate tests and run the code in one pass,
+    running the code on `executor` (see executors.py) and yielding
+    (event, data) pairs as each stage finishes:
+      ('language', str) / ('code', str)  while the transcription streams in
+      ('transcription', {...})           the full /api/imgtocode result
+      ('run', {...})                     the transcribed code compiled and run
+      ('tests', {...})                   the /api/generatetests result
+      ('tests_run', {...})               the code with tests, compiled and run
+      ('error', {'error': str})          a stage failed; after a failed run
+                                         nothing but 'done' follows
+      ('done', {})                       always last
+    The transcribed code is compiled and run while its tests are still being
+    generated, so 'run' and 'tests' arrive in whichever order they finish;
+    'tests_run' is only sent when tests were created.
+    """
+    try:
+        transcription = None
+        for event, data in stream_code(img_url=img_url, img_base64=img_base64):
+            if event == 'result':
+                transcription = data
+            yield event if event != 'result' else 'transcription', data
+    except LLMError as e:
+        yield 'error', {'error': str(e)}
+        yield 'done', {}
+        return
+
+    code = transcription['code']
+    language = transcription['language'].lower()
+    if language not in ALLOWED_LANGUAGES:
+        yield 'error', {'error': f"Language '{language}' not supported."}
+        yield 'done', {}
+        return
+
+    # Not a `with` block: a client that disconnects should not wait for the stages
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='workflow')
+    try:
+        run = pool.submit(executor.compile_and_run, code, language, opt_level)
+        tests = pool.submit(generate_tests, code, language)
+        tests_run = None
+        pending = {run, tests}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future is run or future is tests_run:
+                    try:
+                        response, _ = future.result()
+                    except Exception as e:
+                        logger.exception("Workflow run failed")
+                        yield 'error', {'error': f"Could not run the code: {e}"}
+                        pending = set()
+                        break
+                    yield 'run' if future is run else 'tests_run', response
+                    continue
+                try:
+                    test_code, _, reason, status = future.result()
+                except LLMError as e:
+                    yield 'error', {'error': str(e)}
+                    continue
+                yield 'tests', {'code': test_code, 'language': language, 'reason': reason, 'status': status}
+                if test_code and str(status) == '1':
+                    tests_run = pool.submit(executor.compile_and_run, test_code, language, opt_level)
+                    pending.add(tests_run)
+    finally:
+        pool.shutdown(wait=False)
+    yield 'done', {}